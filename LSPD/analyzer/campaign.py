@@ -0,0 +1,169 @@
+# Localized-States contributors
+# 2026-10
+
+import os
+import sys
+import glob
+import json
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+class CampaignRunner:
+    """Run the analysis scripts in every defect folder of a directory tree.
+
+    Every folder with a vasprun.xml or a POSCAR is a defect folder, except the perfect
+    reference read by the scripts as ../perfect. The scripts run inside it, as when
+    cd-ing into it, and write to localized-defects/<folder>/Data|Figures as usual.
+    Each script is a separate process and 'jobs' folders are processed at the same time
+    by threads: they only wait for those processes, a process pool would add one more
+    process per folder. A failing script only affects its folder, its output is kept in
+    localized-defects/<folder>/Data/campaign.log. The inputs (size, mtime), options, start
+    time and outputs (OUTPUTS) of the scripts that succeeded are kept in
+    localized-defects/<folder>/Data/campaign.json, later runs skip the scripts whose inputs
+    and options did not change and whose outputs are still there, not older than that start.
+    """
+    # Files read by each script, relative to the defect folder: (required, optional)
+    INPUTS = {"locplot.py": (["vasprun.xml"], []),
+              "eigenplot.py": (["vasprun.xml"], []),
+              "localized.py": (["vasprun.xml"], []),
+              "ipr.py": (["vasprun.xml"], ["WAVECAR", "POSCAR", "../perfect/POSCAR"]),
+              "defects.py": (["POSCAR", "../perfect/POSCAR"], [])}
+    # Files written by each script, relative to the defect folder ({name}: name of the folder)
+    OUTPUTS = {"locplot.py": ["localized-defects/{name}/Figures/Spin_*-kpoint_*.png"],
+               "eigenplot.py": ["kohn-sham-states.png"],
+               "localized.py": ["localized-defects/{name}/Data/localized_{name}.dat"],
+               "ipr.py": ["localized-defects/{name}/Figures/*IPR-Spin_*-kpoint_*.png"],
+               "defects.py": ["localized-defects/{name}/Data/neighbor_atoms.dat"]}
+    MARKERS = ("vasprun.xml", "POSCAR")
+    REFERENCE = "perfect"  # folder of the perfect supercell, not a defect
+
+    def __init__(self, base_directory=".", scripts=("locplot.py", "eigenplot.py", "localized.py", "defects.py"), options=(), jobs=1, force=False):
+        self.base_directory = base_directory
+        self.scripts = [os.path.abspath(script) for script in scripts]
+        self.options = list(options)  # command-line options given to every script
+        self.jobs = jobs or os.cpu_count() or 1
+        self.force = force  # run the scripts even if they are up to date
+
+    def find_folders(self):
+        "Defect folders below base_directory, the perfect reference and the output folders (localized-defects, *.lspd) are not searched."
+        folders = []
+        for root, dirs, files in os.walk(self.base_directory):
+            dirs[:] = sorted(d for d in dirs if d not in ('localized-defects', self.REFERENCE) and not d.endswith('.lspd'))
+            if any(marker in files for marker in self.MARKERS):
+                folders.append(root)
+        return folders
+
+    def data_folder(self, folder):
+        folder_name = os.path.basename(os.path.abspath(folder))
+        return os.path.join(folder, 'localized-defects', folder_name, 'Data')
+
+    def inputs(self, folder, script):
+        "Size and mtime of the files read by a script in a folder, None if a required one is missing."
+        required, optional = self.INPUTS.get(os.path.basename(script), (["vasprun.xml"], []))
+        fingerprint = {}
+        for name in required + optional:
+            path = os.path.join(folder, name)
+            if os.path.exists(path):
+                stat = os.stat(path)
+                fingerprint[name] = [stat.st_size, stat.st_mtime_ns]
+            elif name in required:
+                return None
+        # The script itself, e.g. after changing the VBM and CBM
+        stat = os.stat(script)
+        fingerprint[script] = [stat.st_size, stat.st_mtime_ns]
+        return fingerprint
+
+    def outputs(self, folder, script, started):
+        "Outputs of a script in a folder written after 'started' (mtime, ns), None if one of them is missing."
+        folder_name = os.path.basename(os.path.abspath(folder))
+        written = []
+        for pattern in self.OUTPUTS.get(os.path.basename(script), []):
+            files = glob.glob(os.path.join(glob.escape(folder), pattern.format(name=glob.escape(folder_name))))
+            files = sorted(os.path.relpath(path, folder) for path in files if os.stat(path).st_mtime_ns >= started)
+            if not files:
+                return None
+            written.extend(files)
+        return written
+
+    def up_to_date(self, folder, stamp, previous):
+        "True if the script ran with the same inputs and options and the outputs of that run are still there, not older."
+        if previous is None or {key: previous.get(key) for key in stamp} != stamp or "started" not in previous:
+            return False
+        for name in previous.get("outputs", []):
+            path = os.path.join(folder, name)
+            if not os.path.exists(path) or os.stat(path).st_mtime_ns < previous["started"]:
+                return False
+        return True
+
+    def run_folder(self, folder):
+        "Run the scripts in one folder, returns {script: 'done' | 'up to date' | 'missing inputs' | 'no output' | 'failed'}."
+        data_folder = self.data_folder(folder)
+        stamp_file = os.path.join(data_folder, 'campaign.json')
+        try:
+            with open(stamp_file) as file:
+                stamps = json.load(file)
+        except (OSError, ValueError):
+            stamps = {}
+
+        # No display needed to save the figures
+        env = dict(os.environ)
+        env.setdefault("MPLBACKEND", "Agg")
+
+        status = {}
+        for script in self.scripts:
+            name = os.path.basename(script)
+            inputs = self.inputs(folder, script)
+            if inputs is None:
+                status[name] = "missing inputs"
+                continue
+            stamp = {"inputs": inputs, "options": self.options}
+            if not self.force and self.up_to_date(folder, stamp, stamps.get(name)):
+                status[name] = "up to date"
+                continue
+
+            os.makedirs(data_folder, exist_ok=True)
+            with open(os.path.join(data_folder, 'campaign.log'), 'a') as log:
+                log.write(f"\n### {name} {' '.join(self.options)}\n")
+                log.flush()
+                # Start time on the file system clock, the outputs must be newer
+                started = os.fstat(log.fileno()).st_mtime_ns
+                process = subprocess.run([sys.executable, script] + self.options, cwd=folder, env=env,
+                                         stdout=log, stderr=subprocess.STDOUT)
+            outputs = self.outputs(folder, script, started) if process.returncode == 0 else None
+            if outputs is not None:
+                stamps[name] = dict(stamp, started=started, outputs=outputs)
+                status[name] = "done"
+            elif process.returncode == 0:
+                # Nothing written, e.g. moved or deleted meanwhile: run again next time
+                stamps.pop(name, None)
+                status[name] = "no output"
+            else:
+                stamps.pop(name, None)
+                status[name] = "failed"
+
+        if os.path.isdir(data_folder):
+            with open(stamp_file, 'w') as file:
+                json.dump(stamps, file, indent=1)
+        return status
+
+    def run(self):
+        "Run the scripts in every defect folder and print the status of each one."
+        folders = self.find_folders()
+        print(f"{len(folders)} defect folders found in {os.path.abspath(self.base_directory)}")
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            futures = [(folder, executor.submit(self.run_folder, folder)) for folder in folders]
+            for folder, future in futures:
+                try:
+                    results[folder] = future.result()
+                except (OSError, ValueError, subprocess.SubprocessError) as error:
+                    results[folder] = {os.path.basename(script): f"error ({error})" for script in self.scripts}
+                print(f"{folder:<40} " + ", ".join(f"{name}: {state}" for name, state in results[folder].items()))
+
+        failed = [folder for folder, status in results.items() if any(state not in ("done", "up to date", "missing inputs") for state in status.values())]
+        if failed:
+            print(f"\n{len(failed)} folders with failures, see localized-defects/<folder>/Data/campaign.log:")
+            for folder in failed:
+                print(f"  {folder}")
+        return results
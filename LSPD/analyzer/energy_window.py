@@ -0,0 +1,82 @@
+# Localized-States contributors
+# 2026-10
+
+import numpy as np
+
+class EnergyWindowIndex:
+    """Sorted eigenvalues of every (spin, kpoint) block.
+
+    energies: [..., band] array, e.g. [spin, kpoint, band] or a single block [band].
+    bands_in_window() answers which bands fall in [emin, emax] with a binary search,
+    it costs O(log n) plus the size of the output whatever the number of bands.
+    """
+    def __init__(self, energies):
+        energies = np.asarray(energies, dtype=float)
+        self.order = np.argsort(energies, axis=-1, kind='stable')
+        self.sorted_energies = np.take_along_axis(energies, self.order, axis=-1)
+
+    def bands_in_window(self, emin, emax, *position):
+        "Band positions (in band order) of the block 'position' with emin <= energy <= emax."
+        sorted_energies = self.sorted_energies[position]
+        start = np.searchsorted(sorted_energies, emin, side='left')
+        end = np.searchsorted(sorted_energies, emax, side='right')
+        return np.sort(self.order[position][start:end])
+
+
+def table_precision(values, decimals=3):
+    """Values rounded to the decimals of the results table (3: f'{value:.3f}').
+
+    Used to compare or group energies as they are printed, the figures keep the raw energies.
+    """
+    return np.round(np.asarray(values, dtype=float), decimals)
+
+
+def band_groups(energies, bands, tolerance=0.1, kpoints=None):
+    """Bands within 'tolerance' (eV) of each state, one sorted tuple per state (same order).
+
+    Gives the same groups as testing every pair, |E_i - E_j| <= tolerance (and the same
+    k-point when kpoints is given). The states are sorted by k-point and energy and the
+    window of each one is found in one linear sweep: O(n log n) instead of O(n^2).
+    """
+    energies = np.asarray(energies, dtype=float)
+    keys = np.zeros(len(energies)) if kpoints is None else np.asarray(kpoints)
+    order = np.lexsort((energies, keys))
+    groups = [None] * len(order)
+    start = end = 0
+    for position, i in enumerate(order):
+        # Window [start, end) of the sorted states, both ends only move forward
+        while keys[order[start]] != keys[i] or energies[i] - energies[order[start]] > tolerance:
+            start += 1
+        end = max(end, position + 1)
+        while end < len(order) and keys[order[end]] == keys[i] and energies[order[end]] - energies[i] <= tolerance:
+            end += 1
+        groups[i] = tuple(sorted({bands[j] for j in order[start:end]}))
+    return groups
+
+
+def degenerate_groups(energies, bands, occupancies, kpoints=None, threshold=0.006):
+    """Groups of degenerate states of every k-point, any multiplicity.
+
+    The states are sorted by k-point and energy and swept once: a group starts at the
+    lowest state not grouped yet and takes the next ones within 'threshold' (eV) of it.
+    Returns a list of dictionaries sorted by k-point and energy:
+        kpoint, energy ----> k-point and energy of the lowest state
+        bands, occupancies ----> of every state in the group
+        positions ----> indices of the states in the input lists
+    """
+    energies = np.asarray(energies, dtype=float)
+    keys = np.zeros(len(energies), dtype=int) if kpoints is None else np.asarray(kpoints)
+    order = np.lexsort((energies, keys))
+    groups = []
+    start = 0
+    while start < len(order):
+        first = order[start]
+        end = start + 1
+        while end < len(order) and keys[order[end]] == keys[first] and energies[order[end]] - energies[first] <= threshold:
+            end += 1
+        positions = order[start:end].tolist()
+        groups.append({"kpoint": keys[first].item(), "energy": energies[first].item(),
+                       "bands": [bands[i] for i in positions], "occupancies": [occupancies[i] for i in positions],
+                       "positions": positions})
+        start = end
+    return groups
@@ -2,10 +2,37 @@
 # 2024-11
 
 from ase.io import read
+from scipy.spatial import cKDTree
 import numpy as np
+import itertools
 import os
 
+class DefectClassification:
+    """Defects found by DefectAnalysis, computed once and read by the print and save methods.
+
+    matches[i] ----> perfect site (0-based) of the defect atom i, -1 for the interstitials
+    pairs ----> (index in the defect POSCAR, index in the perfect POSCAR) of the matched atoms, 1-based
+    vacancies, susbstitutional, interstitial ----> as returned by the find_* methods
+    sites ----> fractional positions of the vacancies, substitutionals and interstitials, in this order
+    *_neighbors ----> closest atoms (distance, symbol, position, index) of each defect of the list
+    """
+    def __init__(self, matches, vacancies, susbstitutional, interstitial, sites,
+                 vacancy_neighbors, substitutional_neighbors, interstitial_neighbors):
+        self.matches = matches
+        self.pairs = [(i + 1, j + 1) for i, j in enumerate(matches.tolist()) if j >= 0]
+        self.vacancies = vacancies
+        self.susbstitutional = susbstitutional
+        self.interstitial = interstitial
+        self.sites = sites
+        self.vacancy_neighbors = vacancy_neighbors
+        self.substitutional_neighbors = substitutional_neighbors
+        self.interstitial_neighbors = interstitial_neighbors
+
+
 class DefectAnalysis:
+    # Translations to the cell itself and its 26 neighbours
+    SHIFTS = np.array(list(itertools.product((-1, 0, 1), repeat=3)))
+
     def __init__(self, defect_file= "POSCAR_defect", perfect_file= "POSCAR_perfect"):
         self.defect_file = defect_file
         self.perfect_file = perfect_file
@@ -18,75 +45,132 @@ class DefectAnalysis:
         self.symbols_defect = self.poscar_defect.get_chemical_symbols()
         self.symbols_perfect = self.poscar_perfect.get_chemical_symbols()
         self.tolerance = 0.001
+        self._classification = None
 
     def cartesian_distance(self, frac_pos_a, frac_pos_b):
-        cart_pos_a = np.dot(frac_pos_a, self.lattice_matrix)
-        cart_pos_b = np.dot(frac_pos_b, self.lattice_matrix)
-        return np.linalg.norm(cart_pos_a - cart_pos_b)
+        "Minimum-image distance (A) between fractional positions, broadcast over the leading axes."
+        difference = np.asarray(frac_pos_a, dtype=float) - np.asarray(frac_pos_b, dtype=float)
+        difference = difference - np.round(difference)
+        images = np.dot(difference[..., np.newaxis, :] + self.SHIFTS, np.asarray(self.lattice_matrix))
+        return np.linalg.norm(images, axis=-1).min(axis=-1)
+
+    def match_sites(self):
+        """Index (0-based) of the perfect site occupied by every defect atom, -1 for the atoms out of the perfect sites.
+
+        The perfect sites go in a KD-tree with their periodic images close to the faces of
+        the cell, so that atoms wrapped to the other side of the cell are still matched, and
+        all the defect atoms are looked up in one query within the tolerance.
+        """
+        lattice = np.asarray(self.lattice_matrix)
+        perfect = np.mod(self.frac_positions_perfect, 1.0)
+        defect = np.mod(self.frac_positions_defect, 1.0)
+
+        # Images of the perfect sites, only those within the tolerance of the cell are kept
+        images = (perfect[:, np.newaxis, :] + self.SHIFTS).reshape(-1, 3)
+        margin = self.tolerance * np.linalg.norm(np.linalg.inv(lattice), axis=0)
+        inside = np.all((images > -margin) & (images < 1 + margin), axis=1)
+        sites = np.flatnonzero(inside) // len(self.SHIFTS)
+
+        tree = cKDTree(np.dot(images[inside], lattice))
+        distances, nearest = tree.query(np.dot(defect, lattice), distance_upper_bound=self.tolerance)
+        found = distances < self.tolerance
+        return np.where(found, sites[np.minimum(nearest, len(sites) - 1)], -1)
+
+    def classify_sites(self):
+        "DefectClassification of the atoms, from one matching of the defect atoms to the perfect sites."
+        matches = self.match_sites()
+        occupied = np.zeros(len(self.frac_positions_perfect), dtype=bool)
+        occupied[matches[matches >= 0]] = True
+
+        vacancies = [(self.symbols_perfect[j], self.frac_positions_perfect[j], j + 1) for j in np.flatnonzero(~occupied).tolist()]
+        susbstitutional = [(self.symbols_defect[i], self.symbols_perfect[j], self.frac_positions_defect[i], i + 1, j + 1)
+                           for i, j in enumerate(matches.tolist()) if j >= 0 and self.symbols_defect[i] != self.symbols_perfect[j]]
+        interstitial = [(self.symbols_defect[i], self.frac_positions_defect[i], i + 1) for i in np.flatnonzero(matches < 0).tolist()]
+
+        # Neighbors of every defect from one distance matrix
+        sites = [frac_position for _, frac_position, _ in vacancies]
+        sites += [frac_position for _, _, frac_position, _, _ in susbstitutional]
+        sites += [frac_position for _, frac_position, _ in interstitial]
+        shells = self.closest_atoms(sites)
+        vacancy_neighbors = shells[:len(vacancies)]
+        substitutional_neighbors = [self.substitutional_shell(frac_position, shell, vacancies) for (_, _, frac_position, _, _), shell
+                                    in zip(susbstitutional, shells[len(vacancies):len(vacancies) + len(susbstitutional)])]
+        interstitial_neighbors = shells[len(vacancies) + len(susbstitutional):]
+
+        return DefectClassification(matches, vacancies, susbstitutional, interstitial, sites,
+                                    vacancy_neighbors, substitutional_neighbors, interstitial_neighbors)
+
+    @property
+    def classification(self):
+        "DefectClassification of the atoms, computed on first use (create a new DefectAnalysis after changing the tolerance)."
+        if self._classification is None:
+            self._classification = self.classify_sites()
+        return self._classification
 
     def find_vacancy(self):
-        vacancies = []
-        for i, pos_a in enumerate(self.frac_positions_perfect):
-            found = False
-            for pos_b in self.frac_positions_defect:
-                if self.cartesian_distance(pos_a, pos_b) < self.tolerance:
-                    found = True
-                    break
-            if not found:
-                vacancies.append((self.symbols_perfect[i], pos_a, i + 1))
-        return vacancies
+        return self.classification.vacancies
 
     def find_susbstitutional(self):
-        susbstitutional = []
-        for i, pos_a in enumerate(self.frac_positions_defect):
-            for j, pos_b in enumerate(self.frac_positions_perfect):
-                if self.cartesian_distance(pos_a, pos_b) < self.tolerance:
-                    if self.symbols_defect[i] != self.symbols_perfect[j]:
-                        susbstitutional.append((self.symbols_defect[i], self.symbols_perfect[j], pos_a, i + 1, j + 1))
-                    break
-        return susbstitutional
+        return self.classification.susbstitutional
 
     def find_interstitial(self):
-        interstitial = []
-        for i, pos_a in enumerate(self.frac_positions_defect):
-            found = False
-            for pos_b in self.frac_positions_perfect:
-                if self.cartesian_distance(pos_a, pos_b) < self.tolerance:
-                    found = True
-                    break
-            if not found:
-                interstitial.append((self.symbols_defect[i], pos_a, i + 1))
-        return interstitial
+        return self.classification.interstitial
+
+    def defect_sites(self):
+        "Fractional positions of the vacancies, substitutionals and interstitials, in this order."
+        return list(self.classification.sites)
+
+    def closest_atoms(self, target_frac_positions):
+        "find_closest_atoms of several positions, the distances to the defect atoms are computed together."
+        if not len(target_frac_positions):
+            return []
+        targets = np.asarray(target_frac_positions, dtype=float).reshape(-1, 3)
+        distances = self.cartesian_distance(self.frac_positions_defect[np.newaxis, :, :], targets[:, np.newaxis, :])
+
+        shells = []
+        for target, row in zip(targets, distances):
+            others = np.flatnonzero(~np.all(self.frac_positions_defect == target, axis=1))
+            if not others.size:
+                shells.append([])
+                continue
+            order = others[np.argsort(row[others], kind='stable')]
+            shell = order[np.isclose(row[order], row[order[0]], atol=0.001)]
+            shells.append([(float(row[i]), self.symbols_defect[i], self.frac_positions_defect[i], i + 1) for i in shell.tolist()])
+        return shells
 
     def find_closest_atoms(self, target_frac_position):
-        distances = []
-        for i, frac_pos in enumerate(self.frac_positions_defect):
-            if not np.array_equal(target_frac_position, frac_pos):
-                distance = self.cartesian_distance(target_frac_position, frac_pos)
-                distances.append((distance, self.symbols_defect[i], frac_pos, i + 1))
-
-        distances.sort(key=lambda x: x[0])
-
-        if distances:
-            closest_distance = distances[0][0]
-            same_distance_atoms = [atom for atom in distances if np.isclose(atom[0], closest_distance, atol=0.001)]
-            return same_distance_atoms
-        return []
+        "Defect atoms at the shortest (minimum-image) distance of a position, the atom at the position itself is left out."
+        return self.closest_atoms([target_frac_position])[0]
+
+    def substitutional_shell(self, frac_position, closest_atoms, vacancies):
+        "Closest atoms of a substitutional, with the vacancies on its site, keeping those at the shortest distance."
+        closest_atoms = list(closest_atoms)
+        for missed_symbol, missed_position, missed_index in vacancies:
+            distance = self.cartesian_distance(frac_position, missed_position)
+            if distance < self.tolerance:
+                closest_atoms.append((float(distance), missed_symbol, missed_position, missed_index))
+
+        if not closest_atoms:
+            return []
+        closest_distance = closest_atoms[0][0]
+        same_distance_atoms = [atom for atom in closest_atoms if np.isclose(atom[0], closest_distance)]
+        same_distance_atoms.sort(key=lambda x: x[0])
+        return same_distance_atoms
 
     def print_closest_to_vacancy(self):
-        vacancies = self.find_vacancy()
+        classification = self.classification
+        vacancies = classification.vacancies
         folder_name = os.path.basename(os.getcwd())
         localized_folder = f'localized-defects/{folder_name}/Data'
         if not os.path.exists(localized_folder):
             os.makedirs(localized_folder)
 
         if vacancies:
-            for symbol, frac_position, index in vacancies:
+            for (symbol, frac_position, index), closest_atoms in zip(vacancies, classification.vacancy_neighbors):
                 print(f"\nVacancy: V_{symbol}")
                 print(f"Index in /perfect/POSCAR: {index}")
                 print(f"Position: {frac_position}")
 
-                closest_atoms = self.find_closest_atoms(frac_position)
                 print(f"\nClosest neighbors to the V_{symbol} defect in {folder_name}/POSCAR:")
                 print(f"{'Index':<10} {'Atom':<10} {'Position':<30} {'Distance (A)':<10}")
 
@@ -95,32 +179,22 @@ class DefectAnalysis:
                     print(f"{neighbor_index:<10} {neighbor_symbol:<10} {frac_pos_str:<30} {distance:<10.4f}")
 
     def print_closest_to_substitutional(self):
-        vacancies = self.find_vacancy()
-        susbstitutional = self.find_susbstitutional()
+        classification = self.classification
+        susbstitutional = classification.susbstitutional
         folder_name = os.path.basename(os.getcwd())
         localized_folder = f'localized-defects/{folder_name}/Data'
         if not os.path.exists(localized_folder):
             os.makedirs(localized_folder)
 
         if susbstitutional:
-            for new_symbol, old_symbol, frac_position, old_index, new_index in susbstitutional:
+            for (new_symbol, old_symbol, frac_position, old_index, new_index), same_distance_atoms in zip(susbstitutional, classification.substitutional_neighbors):
                 print("\n##################################################################")
                 print(f"\nSubstitutional: {new_symbol}_{old_symbol}")
                 print(f"Index in /perfect/POSCAR: {new_index}")
                 print(f"Index in {folder_name}/POSCAR: {old_index}")
                 print(f"Position: {frac_position}")
 
-                closest_atoms = self.find_closest_atoms(frac_position)
-                for missed_atom in vacancies:
-                    missed_symbol, missed_position, missed_index = missed_atom
-                    if self.cartesian_distance(frac_position, missed_position) < self.tolerance:
-                        closest_atoms.append((self.cartesian_distance(frac_position, missed_position), missed_symbol, missed_position, missed_index))
-
-                if closest_atoms:
-                    closest_distance = closest_atoms[0][0]
-                    same_distance_atoms = [atom for atom in closest_atoms if np.isclose(atom[0], closest_distance)]
-                    same_distance_atoms.sort(key=lambda x: x[0])
-
+                if same_distance_atoms:
                     print(f"\nClosest neighbors to the {new_symbol}_{old_symbol} defect in {folder_name}/POSCAR:")
                     print(f"{'Index':<10} {'Atom':<10} {'Position':<30} {'Distance (A)':<10}")
                     for distance, neighbor_symbol, neighbor_frac_position, neighbor_index in same_distance_atoms:
@@ -128,20 +202,20 @@ class DefectAnalysis:
                         print(f"{neighbor_index:<10} {neighbor_symbol:<10} {frac_pos_str:<30} {distance:<10.4f}")
 
     def print_closest_to_interstitial(self):
-        interstitial = self.find_interstitial()
+        classification = self.classification
+        interstitial = classification.interstitial
         folder_name = os.path.basename(os.getcwd())
         localized_folder = f'localized-defects/{folder_name}/Data'
         if not os.path.exists(localized_folder):
             os.makedirs(localized_folder)
 
         if interstitial:
-            for symbol, frac_position, index in interstitial:
+            for (symbol, frac_position, index), closest_atoms in zip(interstitial, classification.interstitial_neighbors):
                 print("\n##################################################################")
                 print(f"Interstitial: {symbol}_i")
                 print(f"Index in {folder_name}/POSCAR: {index}")
                 print(f"Position: {frac_position}")
 
-                closest_atoms = self.find_closest_atoms(frac_position)
                 print(f"\nClosest neighbors to the {symbol}_i defect in {folder_name}/POSCAR:")
                 print(f"{'Index':<10} {'Atom':<10} {'Position':<30} {'Distance (A)':<10}")
                 for distance, neighbor_symbol, neighbor_frac_position, neighbor_index in closest_atoms:
@@ -149,9 +223,10 @@ class DefectAnalysis:
                     print(f"{neighbor_index:<10} {neighbor_symbol:<10} {frac_pos_str:<30} {distance:<10.4f}")
             
     def save_defect_data(self):
-        vacancies = self.find_vacancy()
-        susbstitutional = self.find_susbstitutional()
-        interstitial = self.find_interstitial()
+        classification = self.classification
+        vacancies = classification.vacancies
+        susbstitutional = classification.susbstitutional
+        interstitial = classification.interstitial
         
         folder_name = os.path.basename(os.getcwd())
         localized_folder = f'localized-defects/{folder_name}/Data'
@@ -162,12 +237,11 @@ class DefectAnalysis:
 
         with open(output_file, "w") as file:
             if vacancies:
-                for symbol, frac_position, index in vacancies:
+                for (symbol, frac_position, index), closest_atoms in zip(vacancies, classification.vacancy_neighbors):
                     file.write(f"\nVacancy: V_{symbol}\n")
                     file.write(f"Index in ../perfect/POSCAR: {index}\n")
                     file.write(f"Position: {frac_position}\n")
 
-                    closest_atoms = self.find_closest_atoms(frac_position)
                     file.write(f"\nClosest neighbors to the V_{symbol} defect in {folder_name}/POSCAR:\n")
                     file.write(f"{'Index':<10} {'Atom':<10} {'Position':<30} {'Distance (A)':<10}\n")
                     for distance, neighbor_symbol, neighbor_frac_position, neighbor_index in closest_atoms:
@@ -175,24 +249,14 @@ class DefectAnalysis:
                         file.write(f"{neighbor_index:<10} {neighbor_symbol:<10} {frac_pos_str:<30} {distance:<10.4f}\n")
 
             if susbstitutional:
-                for new_symbol, old_symbol, frac_position, old_index, new_index in susbstitutional:
+                for (new_symbol, old_symbol, frac_position, old_index, new_index), same_distance_atoms in zip(susbstitutional, classification.substitutional_neighbors):
                     file.write("\n##################################################################\n")
                     file.write(f"\nSubstitutional: {new_symbol}_{old_symbol}\n")
                     file.write(f"Index in ../perfect/POSCAR: {new_index}\n")
                     file.write(f"Index in {folder_name}/POSCAR: {old_index}\n")
                     file.write(f"Position: {frac_position}\n")
 
-                    closest_atoms = self.find_closest_atoms(frac_position)
-                    for missed_atom in vacancies:
-                        missed_symbol, missed_position, missed_index = missed_atom
-                        if self.cartesian_distance(frac_position, missed_position) < self.tolerance:
-                            closest_atoms.append((self.cartesian_distance(frac_position, missed_position), missed_symbol, missed_position, missed_index))
-
-                    if closest_atoms:
-                        closest_distance = closest_atoms[0][0]
-                        same_distance_atoms = [atom for atom in closest_atoms if np.isclose(atom[0], closest_distance)]
-                        same_distance_atoms.sort(key=lambda x: x[0])
-
+                    if same_distance_atoms:
                         file.write(f"\nClosest neighbors to the {new_symbol}_{old_symbol} defect in {folder_name}/POSCAR:\n")
                         file.write(f"{'Index':<10} {'Atom':<10} {'Position':<30} {'Distance (A)':<10}\n")
                         for distance, neighbor_symbol, neighbor_frac_position, neighbor_index in same_distance_atoms:
@@ -200,14 +264,13 @@ class DefectAnalysis:
                             file.write(f"{neighbor_index:<10} {neighbor_symbol:<10} {frac_pos_str:<30} {distance:<10.4f}\n")
 
             if interstitial:
-                for symbol, frac_position, index in interstitial:
+                for (symbol, frac_position, index), closest_atoms in zip(interstitial, classification.interstitial_neighbors):
 
                     file.write("\n##################################################################\n")
                     file.write(f"Interstitial: {symbol}_i\n")
                     file.write(f"Index in {folder_name}/POSCAR: {index}\n")
                     file.write(f"Position: {frac_position}\n")
 
-                    closest_atoms = self.find_closest_atoms(frac_position)
                     file.write(f"\nClosest neighbors to the {symbol}_i defect in {folder_name}/POSCAR:\n")
                     file.write(f"{'Index':<10} {'Atom':<10} {'Position':<30} {'Distance (A)':<10}\n")
                     for distance, neighbor_symbol, neighbor_frac_position, neighbor_index in closest_atoms:
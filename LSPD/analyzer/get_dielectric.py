@@ -1,24 +1,34 @@
-from LSPD.reader.reader import VasprunReader
+from LSPD.reader.reader import VasprunStreamReader
+from LSPD.reader.dataset import VasprunData
 
 class DielectricAnalyzer:
     def __init__(self, xml_reader):
-        self.root = xml_reader.get_root()
+        self.tensors = {}
+        if isinstance(xml_reader, VasprunData):
+            self.tensors = dict(xml_reader.dielectric)
+        else:
+            # Only the dielectric varrays are kept from the stream
+            if not isinstance(xml_reader, VasprunStreamReader):
+                xml_reader = VasprunStreamReader(xml_reader)
+            for kind, name, values in xml_reader.iter_blocks():
+                if kind == "dielectric":
+                    self.tensors[name] = values
 
     def parse_dielectric_tensor(self):
         # Parsing the ionic dielectric tensor
-        epsilon_ion = self.root.find(".//varray[@name='epsilon_ion']")
+        epsilon_ion = self.tensors.get("epsilon_ion")
         if epsilon_ion is not None:
             print("Ionic dielectric tensor:")
-            for vector in epsilon_ion.findall("v"):
-                print(vector.text)
+            for vector in epsilon_ion:
+                print(vector)
         else:
             print("The ionic dielectric tensor was not found in the vasprun.xml file.")
 
         # Parsing the electronic dielectric tensor
-        epsilon = self.root.find(".//varray[@name='epsilon']")
+        epsilon = self.tensors.get("epsilon")
         if epsilon is not None:
             print("\nElectronic dielectric tensor:")
-            for vector in epsilon.findall("v"):
-                print(vector.text)
+            for vector in epsilon:
+                print(vector)
         else:
             print("The electronic dielectric tensor was not found in the vasprun.xml file.")
@@ -1,54 +1,63 @@
-from LSPD.reader.reader import VasprunReader
+from LSPD.reader.dataset import load_vasprun
+import numpy as np
 
 class GapAnalyzer:
-    def __init__(self, spin_numbers, kpoint_numbers, xml_reader="vasprun.xml"):
-        self.xml_reader = VasprunReader(xml_reader)
-        self.root = self.xml_reader.get_root()
+    """VBM and CBM from the eigenvalue/occupation arrays.
+
+    A band is occupied when its occupancy is >= occupied - tolerance and empty when
+    it is <= unoccupied + tolerance, by default the 1.000 and 0.000 occupancies.
+    """
+    def __init__(self, spin_numbers, kpoint_numbers, xml_reader="vasprun.xml", occupied=1.0, unoccupied=0.0, tolerance=1e-5):
+        self.data = load_vasprun(xml_reader)
         self.spin_numbers = spin_numbers
         self.kpoint_numbers = kpoint_numbers
+        self.occupied = occupied
+        self.unoccupied = unoccupied
+        self.tolerance = tolerance
         self.max_energy_1000 = float('-inf')  # store the max energy (VBM)
         self.min_energy_0000 = float('inf')   # store the min energy (CBM)
+        self.vbm_location = None  # (spin, kpoint, band) of the VBM
+        self.cbm_location = None  # (spin, kpoint, band) of the CBM
 
     def analyze(self):
+        # spin superblocks and kpoint blocks present in the file
+        spins = []
         for spin_number in self.spin_numbers:
+            if spin_number in self.data.spin_index:
+                spins.append(spin_number)
+            else:
+                print(f"Superblock 'spin {spin_number}' not found.")
+        kpoints = [kpoint_number for kpoint_number in self.kpoint_numbers if kpoint_number in self.data.kpoint_index]
+        for spin_number in spins:
             for kpoint_number in self.kpoint_numbers:
-                # spin superblock
-                spin_set = self.root.find(f".//set[@comment='spin {spin_number}']")
-                
-                if spin_set is not None:
-                    # kpoint block
-                    kpoint_block = spin_set.find(f".//set[@comment='kpoint {kpoint_number}']")
-                    
-                    if kpoint_block is not None:
-                        last_1_000_energy = None  # last energy with occupancy 1.000
-                        first_0_000_energy = None  # first energy with occupancy 0.000
-                        
-                        for child in kpoint_block:
-                            if child.text:
-                                columns = child.text.split()
-                                if len(columns) >= 2:
-                                    energy = float(columns[0])
-                                    occupancy = float(columns[1])
-                                    
-                                    # Identify the last line with occupancy 1.000 in each kpoint
-                                    if occupancy == 1.000:
-                                        last_1_000_energy = energy
-                                    
-                                    # Identify the first line with occupancy 0.000 in each kpoint
-                                    if occupancy == 0.000 and first_0_000_energy is None:
-                                        first_0_000_energy = energy
-                        
-                        # Update maximum energy with occupancy 1.000
-                        if last_1_000_energy is not None:
-                            self.max_energy_1000 = max(self.max_energy_1000, last_1_000_energy)
-                        
-                        # Update the minimum energy wuth occupancy 0.000
-                        if first_0_000_energy is not None:
-                            self.min_energy_0000 = min(self.min_energy_0000, first_0_000_energy)
-                    else:
-                        print(f"Block 'kpoint {kpoint_number}' not found in 'spin {spin_number}'.")
-                else:
-                    print(f"Superblock 'spin {spin_number}' not found.")
+                if kpoint_number not in self.data.kpoint_index:
+                    print(f"Block 'kpoint {kpoint_number}' not found in 'spin {spin_number}'.")
+        if not spins or not kpoints or self.data.eigenvalues is None:
+            return
+
+        # [spin, kpoint, band, 2] restricted to the requested spins and kpoints
+        spin_positions = [self.data.spin_index[spin_number] for spin_number in spins]
+        kpoint_positions = [self.data.kpoint_index[kpoint_number] for kpoint_number in kpoints]
+        eigenvalues = self.data.eigenvalues[np.ix_(spin_positions, kpoint_positions)]
+        energies, occupancies = eigenvalues[..., 0], eigenvalues[..., 1]
+
+        # Highest occupied and lowest empty level over all spins and kpoints at once
+        occupied_energies = np.where(occupancies >= self.occupied - self.tolerance, energies, -np.inf)
+        empty_energies = np.where(occupancies <= self.unoccupied + self.tolerance, energies, np.inf)
+
+        vbm_index = np.unravel_index(np.argmax(occupied_energies), energies.shape)
+        cbm_index = np.unravel_index(np.argmin(empty_energies), energies.shape)
+
+        if np.isfinite(occupied_energies[vbm_index]):
+            self.max_energy_1000 = float(occupied_energies[vbm_index])
+            self.vbm_location = (spins[vbm_index[0]], kpoints[vbm_index[1]], self.data.band_numbers[vbm_index[2]])
+        if np.isfinite(empty_energies[cbm_index]):
+            self.min_energy_0000 = float(empty_energies[cbm_index])
+            self.cbm_location = (spins[cbm_index[0]], kpoints[cbm_index[1]], self.data.band_numbers[cbm_index[2]])
 
     def get_results(self):
         return self.max_energy_1000, self.min_energy_0000
+
+    def get_locations(self):
+        "(spin, kpoint, band) of the VBM and of the CBM."
+        return self.vbm_location, self.cbm_location
@@ -0,0 +1,364 @@
+# Localized-States contributors
+# 2026-10
+
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from LSPD.reader.wavecar import WavecarReader
+from LSPD.reader.cache import SidecarCache
+
+class IPRAnalyzer:
+    """Inverse participation ratio of the bands stored in a WAVECAR.
+
+        IPR = sum(|psi(r)|^4) / (sum(|psi(r)|^2))^2
+
+    The plane-wave coefficients of a batch of bands are placed in one stacked array
+    and transformed to real space together, one FFT axis at a time for the whole
+    batch. The batch size follows the memory budget (bytes) of the stacked grids.
+    For gamma-only WAVECARs only half of the G vectors are stored, the wavefunction
+    is real and a real inverse FFT on the half grid is used.
+
+    wfc: vaspwfc object, ngrid: real-space grid (by default 2 * wfc._ngrid, as wfc_r).
+    scale: points per dimension relative to that grid, e.g. 0.5 for a quick screening
+    on a coarse grid. The G vectors a coarse grid cannot hold are left out (low-pass)
+    and the IPR is multiplied by N_grid / N_full, it stays comparable to the full grid
+    (the IPR of a uniform state is 1 / N).
+    wavecar: WavecarReader of the same file, the coefficients are then taken from the
+    memory-mapped file instead of being read band by band by wfc.
+    center: fractional position (e.g. the defect site) and radii (A) of the spheres used
+    by metrics(), which returns the spread and the fraction of |psi|^2 in each sphere
+    together with the IPR from the same FFTs.
+    """
+    def __init__(self, wfc, memory=64 * 2**20, ngrid=None, wavecar=None, scale=1.0, center=None, radii=()):
+        self.wfc = wfc
+        self.wavecar = wavecar
+        self.memory = memory
+        self.scale = scale
+        self.full_grid = np.array(ngrid if ngrid is not None else 2 * np.asarray(wfc._ngrid), dtype=int)
+        self.ngrid = np.maximum(np.rint(self.full_grid * scale).astype(int), 1)
+        self.normalization = np.prod(self.ngrid.astype(float)) / np.prod(self.full_grid.astype(float))
+        self.gamma = bool(getattr(wfc, '_lgam', False))
+        self.gamma_half = getattr(wfc, '_gam_half', 'x')
+        self.spinors = 2 if getattr(wfc, '_lsoc', False) else 1
+        self.center = None if center is None else np.asarray(center, dtype=float) % 1.0
+        self.radii = [float(radius) for radius in radii] if center is not None else []
+        self._gvectors = {}
+        self._plans = {}
+        self._spheres = None
+
+    @property
+    def batch_size(self):
+        "Number of bands transformed together within the memory budget."
+        size = int(np.prod(self.ngrid)) * self.spinors
+        if self.gamma:
+            # half complex grid and planes + real grid + density
+            per_band = size * (8 + 8 + 8 + 8)
+        else:
+            # complex grid and planes + transformed grid + density
+            per_band = size * (16 + 16 + 16 + 8)
+        return max(1, int(self.memory // per_band))
+
+    @property
+    def axis_order(self):
+        "Lattice vectors along the grid axes (a, b, c), the halved one is last for gamma-only WAVECARs."
+        if not self.gamma:
+            return [0, 1, 2]
+        half_axis = 'xyz'.index(self.gamma_half)
+        return [axis for axis in (0, 1, 2) if axis != half_axis] + [half_axis]
+
+    @property
+    def lattice(self):
+        "Lattice vectors (A) in the grid axis order."
+        return np.asarray(self.wfc._Acell, dtype=float)[self.axis_order]
+
+    @property
+    def metric_names(self):
+        "Keys of the arrays returned by metrics()."
+        return ["ipr", "spread"] + [f"sphere_{radius:g}" for radius in self.radii]
+
+    def gvectors(self, ikpt):
+        "G vectors of a k-point, read once."
+        if ikpt not in self._gvectors:
+            self._gvectors[ikpt] = np.asarray(self.wfc.gvectors(ikpt), dtype=int)
+        return self._gvectors[ikpt]
+
+    def transform_plan(self, ikpt):
+        """Where the coefficients of a k-point go in the grid, computed once.
+
+        The grid axes are (a, b, c) = (x, y, z), for gamma-only WAVECARs the halved
+        axis is moved last (c) since the IPR does not depend on the axis order.
+        Only the (b, c) lines and c planes that hold coefficients are transformed
+        along a and b, the G vectors fill a sphere of the grid.
+        """
+        if ikpt in self._plans:
+            return self._plans[ikpt]
+        gvec = self.gvectors(ikpt)
+        # Low-pass: the G vectors beyond a coarse grid are left out
+        keep = np.flatnonzero(np.all(np.abs(gvec) <= (self.ngrid - 1) // 2, axis=1))
+        gvec = gvec[keep]
+        order = self.axis_order
+        mirror = np.zeros(0, dtype=int)
+        if self.gamma:
+            half_axis = order[2]
+            # The plane G_half = 0 holds both G and -G = conj(G)
+            mirror = np.flatnonzero((gvec[:, half_axis] == 0) & np.any(gvec != 0, axis=1))
+            gvec = np.concatenate([gvec, -gvec[mirror]])
+        shape = [int(self.ngrid[axis]) for axis in order]
+        depth = shape[2] // 2 + 1 if self.gamma else shape[2]
+        a, b, c = (gvec[:, axis] % size for axis, size in zip(order, shape))
+
+        pairs, pair_index = np.unique(b * depth + c, return_inverse=True)
+        planes, plane_index = np.unique(pairs % depth, return_inverse=True)
+        plan = {"shape": shape, "depth": depth, "keep": keep, "mirror": mirror, "a": a, "pair_index": pair_index.ravel(),
+                "npairs": len(pairs), "pair_b": pairs // depth, "planes": planes, "plane_index": plane_index.ravel()}
+        self._plans[ikpt] = plan
+        return plan
+
+    def batches(self, ispin, ikpt, bands):
+        "Stacked wavefunctions of the bands of one (spin, kpoint), batch by batch: (start, psi)."
+        bands = list(bands)
+        batch_size = self.batch_size
+        for start in range(0, len(bands), batch_size):
+            coefficients = self.read_coefficients(ispin, ikpt, bands[start:start + batch_size])
+            yield start, self.real_space(coefficients, ikpt)
+
+    def ipr(self, ispin, ikpt, bands):
+        "IPR of the bands (1-based indices) of one (spin, kpoint)."
+        bands = list(bands)
+        values = np.empty(len(bands))
+        for start, psi in self.batches(ispin, ikpt, bands):
+            values[start:start + psi.shape[0]] = self.batch_ipr(psi)
+        return values * self.normalization
+
+    def metrics(self, ispin, ikpt, bands):
+        """IPR, spread and sphere fractions of the bands of one (spin, kpoint), from one FFT.
+
+        Returns {name: array} for the metric_names:
+            ipr ----> same values as ipr()
+            spread ----> second moment of |psi|^2 around its centre (A^2), see batch_spread
+            sphere_<r> ----> fraction of |psi|^2 within r (A) of the centre
+        """
+        bands = list(bands)
+        values = {name: np.empty(len(bands)) for name in self.metric_names}
+        for start, psi in self.batches(ispin, ikpt, bands):
+            stop = start + psi.shape[0]
+            density = self.batch_density(psi)
+            values["ipr"][start:stop] = self.density_ipr(density)
+            # Spin-up + spin-down density of the spinors, [band, a, b, c]
+            density = density.sum(axis=1)
+            total = density.reshape(density.shape[0], -1).sum(axis=1)
+            values["spread"][start:stop] = self.batch_spread(density) / total
+            for name, fraction in zip(self.metric_names[2:], self.sphere_sums(density)):
+                values[name][start:stop] = fraction / total
+        values["ipr"] *= self.normalization
+        return values
+
+    def deviation(self, samples, reference=None):
+        """Relative deviation of the IPR from the full grid for a sample of bands.
+
+        samples: [(spin, kpoint, band), ...], reference: IPRAnalyzer on the full grid.
+        Returns the IPR on this grid, on the full grid and the relative deviations.
+        """
+        if reference is None:
+            reference = IPRAnalyzer(self.wfc, memory=self.memory, ngrid=self.full_grid, wavecar=self.wavecar)
+        values = np.array([self.ipr(spin, kpoint, [band])[0] for spin, kpoint, band in samples])
+        full_values = np.array([reference.ipr(spin, kpoint, [band])[0] for spin, kpoint, band in samples])
+        return values, full_values, np.abs(values - full_values) / full_values
+
+    def read_coefficients(self, ispin, ikpt, bands):
+        "Coefficients [band, nplw] of the bands of one (spin, kpoint)."
+        if self.wavecar is not None:
+            return self.wavecar.coefficients(ispin, ikpt, bands)
+        return np.array([self.wfc.readBandCoeff(ispin, ikpt, band) for band in bands])
+
+    def real_space(self, coefficients, ikpt):
+        """Stacked wavefunctions [band, spinor, a, b, c] from the coefficients [band, nplw].
+
+        The normalization is irrelevant for the IPR, the grids are not rescaled.
+        """
+        plan = self.transform_plan(ikpt)
+        nbands = coefficients.shape[0]
+        coefficients = coefficients.reshape(nbands, self.spinors, -1).astype(np.complex128)
+        if self.gamma:
+            # Gamma only: the stored C(G != 0) carry a sqrt(2) factor
+            coefficients[..., 1:] /= np.sqrt(2.0)
+        coefficients = coefficients[..., plan["keep"]]
+        if self.gamma:
+            coefficients = np.concatenate([coefficients, coefficients[..., plan["mirror"]].conj()], axis=-1)
+        na, nb, nc = plan["shape"]
+
+        # Along a, only the (b, c) lines with coefficients
+        lines = np.zeros((nbands, self.spinors, plan["npairs"], na), dtype=np.complex128)
+        lines[:, :, plan["pair_index"], plan["a"]] = coefficients
+        lines = np.fft.ifft(lines, axis=-1)
+
+        # Along b, only the c planes with coefficients
+        planes = np.zeros((nbands, self.spinors, na, nb, len(plan["planes"])), dtype=np.complex128)
+        planes[:, :, :, plan["pair_b"], plan["plane_index"]] = lines.transpose(0, 1, 3, 2)
+        planes = np.fft.ifft(planes, axis=3)
+
+        # Along c, the whole grid (real transform of the half grid for gamma)
+        grid = np.zeros((nbands, self.spinors, na, nb, plan["depth"]), dtype=np.complex128)
+        grid[..., plan["planes"]] = planes
+        del planes
+        if self.gamma:
+            return np.fft.irfft(grid, n=nc, axis=-1)
+        return np.fft.ifft(grid, axis=-1)
+
+    def batch_spread(self, density):
+        """Second moment (A^2, not divided by the norm) of the densities [band, a, b, c].
+
+        Periodic boundaries: the centre along each lattice vector is the circular mean of
+        the density and the displacements are wrapped to [-1/2, 1/2) of the vector. The
+        sums only need the densities summed over one and two axes.
+        """
+        metric = self.lattice @ self.lattice.T
+        ab = density.sum(axis=3)
+        bc = density.sum(axis=1)
+        marginals = [ab.sum(axis=2), ab.sum(axis=1), bc.sum(axis=1)]
+        displacements = []
+        for marginal in marginals:
+            n = marginal.shape[1]
+            center = np.angle(marginal @ np.exp(2j * np.pi * np.arange(n) / n)) / (2 * np.pi)
+            displacements.append((np.arange(n) / n - center[:, None] + 0.5) % 1.0 - 0.5)
+
+        moment = sum(metric[i, i] * np.einsum('bx,bx->b', marginals[i], displacements[i] ** 2) for i in range(3))
+        # Oblique cells: cross terms
+        for (i, j), pair in (((0, 1), ab), ((1, 2), bc), ((0, 2), None)):
+            if not np.isclose(metric[i, j], 0.0):
+                pair = density.sum(axis=2) if pair is None else pair
+                moment = moment + 2 * metric[i, j] * np.einsum('bxy,bx,by->b', pair, displacements[i], displacements[j])
+        return moment
+
+    def sphere_masks(self):
+        "Flat grid indices within each radius of the centre (minimum image), computed once for the grid."
+        if self._spheres is None:
+            metric = self.lattice @ self.lattice.T
+            shape = [int(self.ngrid[axis]) for axis in self.axis_order]
+            center = self.center[self.axis_order]
+            steps = [(np.arange(n) / n - c + 0.5) % 1.0 - 0.5 for n, c in zip(shape, center)]
+            # The neighbouring images only matter for oblique cells
+            if np.allclose(metric, np.diag(np.diag(metric))):
+                shifts = [(0, 0, 0)]
+            else:
+                shifts = itertools.product((-1, 0, 1), repeat=3)
+            distance = np.full(shape, np.inf)
+            for shift in shifts:
+                d = [(steps[i] + shift[i]).reshape([-1 if j == i else 1 for j in range(3)]) for i in range(3)]
+                np.minimum(distance, sum(metric[i, j] * d[i] * d[j] for i in range(3) for j in range(3)), out=distance)
+            distance = distance.ravel()
+            self._spheres = [np.flatnonzero(distance <= radius ** 2) for radius in self.radii]
+        return self._spheres
+
+    def sphere_sums(self, density):
+        "Density [band, a, b, c] summed inside each sphere, one array per radius."
+        if not self.radii:
+            return []
+        density = density.reshape(density.shape[0], -1)
+        return [density[:, mask].sum(axis=1) for mask in self.sphere_masks()]
+
+    @staticmethod
+    def batch_density(psi):
+        "|psi|^2 of a stacked array."
+        if np.iscomplexobj(psi):
+            density = psi.real ** 2
+            density += psi.imag ** 2
+            return density
+        return psi * psi
+
+    @staticmethod
+    def density_ipr(density):
+        "IPR of every band of a stacked [band, ...] density array."
+        density = density.reshape(density.shape[0], -1)
+        return np.einsum('bi,bi->b', density, density) / density.sum(axis=1) ** 2
+
+    @staticmethod
+    def batch_ipr(psi):
+        "IPR of every band of a stacked [band, ...] array, both sums from one density array."
+        return IPRAnalyzer.density_ipr(IPRAnalyzer.batch_density(psi))
+
+
+class IPRCache:
+    """IPR (and the other IPRAnalyzer.metrics) of every (spin, kpoint, band) saved next to the WAVECAR (WAVECAR.lspd folder).
+
+    The bands never computed are NaN, later runs only compute those. The values are
+    kept while the WAVECAR fingerprint (size, mtime, content hash) does not change,
+    one array per quantity, real-space grid and gamma setting. The sphere fractions
+    also depend on the centre (fractional position), it is part of their name.
+    """
+    def __init__(self, wav_file, shape, ngrid, gamma=False, names=("ipr",), center=None):
+        self.sidecar = SidecarCache(wav_file)
+        self.shape = tuple(int(n) for n in shape)
+        setting = f"{'gamma' if gamma else 'kpoints'}_{'x'.join(str(int(n)) for n in ngrid)}"
+        at = "" if center is None else "_at_" + "_".join(f"{x:.6f}" for x in center)
+        self.keys = {name: f"{name}_{setting}" + (at if name.startswith("sphere_") else "") for name in names}
+        self.values = {name: np.full(self.shape, np.nan) for name in names}
+        self.stored = {}  # arrays of the other quantities and grids, written back on save
+
+        meta = self.sidecar.load_meta()
+        if meta is not None and meta.get("shape") == list(self.shape):
+            for key in meta.get("ipr", []):
+                try:
+                    self.stored[key] = self.sidecar.load(key)
+                except (OSError, ValueError):
+                    continue
+            for name, key in self.keys.items():
+                if key in self.stored:
+                    self.values[name] = np.array(self.stored.pop(key), dtype=float)
+
+    def missing(self, spin, kpoint, bands):
+        "Bands of a (spin, kpoint) without a stored value of every quantity."
+        return [band for band in bands
+                if any(np.isnan(values[spin - 1, kpoint - 1, band - 1]) for values in self.values.values())]
+
+    def get(self, spin, kpoint, bands):
+        "Stored {name: array} of the bands of a (spin, kpoint)."
+        bands = np.asarray(bands, dtype=int) - 1
+        return {name: values[spin - 1, kpoint - 1, bands] for name, values in self.values.items()}
+
+    def update(self, spin, kpoint, bands, values):
+        "Store the {name: array} of the bands of a (spin, kpoint)."
+        bands = np.asarray(bands, dtype=int) - 1
+        for name in self.values:
+            self.values[name][spin - 1, kpoint - 1, bands] = values[name]
+
+    def save(self):
+        arrays = dict(self.stored, **{self.keys[name]: values for name, values in self.values.items()})
+        try:
+            self.sidecar.save(arrays, {"shape": list(self.shape), "ipr": list(arrays)})
+        except OSError as error:
+            print(f"Warning: the cache {self.sidecar.folder} could not be written ({error}).")
+
+
+def worker_context():
+    "Start method of the worker processes (IPR and figures): fork keeps the scripts from being imported again by the workers."
+    return multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+
+# IPRAnalyzer of each worker process, every worker opens the WAVECAR itself
+_worker_analyzer = None
+
+def _start_worker(wfc_factory, memory, wav_file, scale, center=None, radii=()):
+    global _worker_analyzer
+    wavecar = WavecarReader(wav_file) if wav_file else None
+    _worker_analyzer = IPRAnalyzer(wfc_factory(), memory=memory, wavecar=wavecar, scale=scale, center=center, radii=radii)
+
+def _worker_ipr(task):
+    spin, kpoint, bands = task
+    return _worker_analyzer.ipr(spin, kpoint, bands)
+
+def _worker_metrics(task):
+    spin, kpoint, bands = task
+    return _worker_analyzer.metrics(spin, kpoint, bands)
+
+def parallel_ipr(wfc_factory, tasks, jobs, memory=64 * 2**20, wav_file=None, scale=1.0, center=None, radii=(), metrics=False):
+    """IPR of the tasks [(spin, kpoint, bands), ...] computed by 'jobs' worker processes.
+
+    wfc_factory() opens the WAVECAR in each worker (e.g. functools.partial(vaspwfc, 'WAVECAR')),
+    it must be picklable. With wav_file the workers memory-map it (WavecarReader) and
+    share the page cache. The IPR arrays are returned in the order of the tasks, with
+    metrics=True the IPRAnalyzer.metrics() dictionaries (center and radii of the spheres).
+    """
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=worker_context(), initializer=_start_worker,
+                             initargs=(wfc_factory, memory, wav_file, scale, center, radii)) as executor:
+        return list(executor.map(_worker_metrics if metrics else _worker_ipr, tasks))
@@ -1,119 +1,305 @@
 # Written by Joseph P.Vera
 # 2024-11
 
-from LSPD.reader.reader import VasprunReader
+import os
+from functools import partial
+from LSPD.reader.dataset import load_vasprun
+from LSPD.reader.wavecar import WavecarReader
+from LSPD.analyzer.get_ipr import IPRAnalyzer, IPRCache, parallel_ipr
 from vaspwfc import vaspwfc
 import numpy as np
+import pandas as pd
+
+def localization_metrics(projections, top=5):
+    """Localization of the bands from their projections.
+
+    projections: [..., ion, orbital] array, any leading dimensions (spin, kpoint, band).
+    Returns the tot of each ion (s + p + d) [..., ion], the total of each band [...] and
+    the sum of the 'top' ion tot values closest to one [...].
+    """
+    if top < 1:
+        raise ValueError(f"top must be a positive integer, got {top}.")
+    # Sequential sums (cumsum), they round exactly like the former loop over the ions
+    ion_tot = projections[..., 0] + projections[..., 1] + projections[..., 2]
+    total = np.cumsum(ion_tot, axis=-1)[..., -1]
+
+    # Partial selection of the 'top' values closest to one, no full sort needed
+    distance = np.abs(ion_tot - 1)
+    if top < ion_tot.shape[-1]:
+        closest = np.argpartition(distance, top - 1, axis=-1)[..., :top]
+    else:
+        closest = np.broadcast_to(np.arange(ion_tot.shape[-1]), ion_tot.shape)
+    # Add them from the closest to one
+    closest = np.take_along_axis(closest, np.argsort(np.take_along_axis(distance, closest, axis=-1), axis=-1, kind='stable'), axis=-1)
+    closest_sum = np.cumsum(np.take_along_axis(ion_tot, closest, axis=-1), axis=-1)[..., -1]
+    return ion_tot, total, closest_sum
+
+
+def participation_ratio(projections):
+    """Atom-projected IPR of the bands, sum(w_i^2) / (sum(w_i))^2 over the ions.
+
+    projections: [..., ion, orbital] array, any leading dimensions (spin, kpoint, band).
+    w_i is the tot of ion i (s + p + d). Returns [...], from 1 / nions for a state spread
+    over every ion to 1 for a state on one ion, NaN for bands without weight.
+    """
+    ion_tot = projections[..., 0] + projections[..., 1] + projections[..., 2]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.einsum('...i,...i->...', ion_tot, ion_tot) / ion_tot.sum(axis=-1) ** 2
+
 
 class ResultsExtractor:
-    def __init__(self, spin_numbers, kpoint_numbers, band_numbers, gamma=False, xml_reader="vasprun.xml", wav_file="WAVECAR"):
-        self.xml_reader = VasprunReader(xml_reader)
-        self.root = self.xml_reader.get_root()
+    """Localization (tot, sum), IPR and projected IPR values of every (spin, kpoint, band).
+
+    The values are kept as columns, create_results_table() returns them with the
+    energy and occupancy of each band in one DataFrame (COLUMNS).
+    """
+    COLUMNS = ("spin", "kpoint", "band", "tot", "sum", "ipr", "proj_ipr", "energy", "occupancy")
+
+    def __init__(self, spin_numbers, kpoint_numbers, band_numbers, gamma=False, xml_reader="vasprun.xml", wav_file="WAVECAR", top=5, memory=64 * 2**20):
+        self.data = load_vasprun(xml_reader)
         self.wav_file = wav_file
         self.spin_numbers = spin_numbers
         self.kpoint_numbers = kpoint_numbers
         self.band_numbers = band_numbers
         self.gamma = gamma
-        self.results = []
-        self.energy_values = []
-        self.occupancy_list = []
+        self.top = top
+        self.memory = memory  # bytes for the stacked IPR FFTs
+        self.blocks = {"localization": [], "ipr": [], "projected": []}  # columns of each (spin, kpoint) block
 
     def extract_results(self):
         "Extracts results, including total sum and closest sums for bands.Information same to the PROCAR file"
-        self.results.append(f"{'Spin':<6} {'k-point':<10} {'Band':<10} {'tot':<10} {'sum':<10}")
-
+        data = self.data
+        if data.projections is None:
+            return
         for spin_number in self.spin_numbers:
-            spin_set = self.root.find(f".//set[@comment='spin{spin_number}']")
-            if spin_set is not None:
-                for kpoint_number in self.kpoint_numbers:
-                    kpoint_block = spin_set.find(f".//set[@comment='kpoint {kpoint_number}']")
-                    if kpoint_block is not None:
-                        for band_number in self.band_numbers:
-                            band_subblock = kpoint_block.find(f".//set[@comment='band {band_number}']")
-                            if band_subblock is not None:
-                                total_sum = 0.0
-                                tot_values = []
-
-                                for child in band_subblock:
-                                    columns = child.text.split()
-                                    total = float(columns[0]) + float(columns[1]) + float(columns[2])
-                                    total_sum += total
-                                    tot_values.append(total)
-
-                                closest_to_one = sorted(tot_values, key=lambda x: abs(x - 1))[:5]
-                                closest_sum = sum(closest_to_one)
-
-                                self.results.append(f"{spin_number:<6} {kpoint_number:<10} {band_number:<10} {total_sum:<10.3f} {closest_sum:<10.3f}")
-
-    def extract_energy_occupancy(self):
-        "Extract energy and occupancy values. Information same to the EIGENVAL file"
+            for kpoint_number in self.kpoint_numbers:
+                position = data.locate(spin_number, kpoint_number)
+                if position is not None:
+                    # One k-point block at a time, the projections may be a memory-mapped file
+                    _, total_sum, closest_sum = localization_metrics(data.read_projections(*position), self.top)
+
+                    band_numbers = [band_number for band_number in self.band_numbers if band_number in data.band_index]
+                    band_positions = [data.band_index[band_number] for band_number in band_numbers]
+                    self._add_block("localization", spin_number, kpoint_number, band_numbers,
+                                    tot=total_sum[band_positions], sum=closest_sum[band_positions])
+
+    def projected_IPR(self):
+        """Atom-projected IPR (proj_ipr) of the bands from the vasprun.xml projections.
+
+        No WAVECAR needed: every band of a (spin, kpoint) block is computed at once from
+        the ion weights, see participation_ratio().
+        """
+        data = self.data
+        if data.projections is None:
+            return
         for spin_number in self.spin_numbers:
             for kpoint_number in self.kpoint_numbers:
-                spin_set = self.root.find(f".//set[@comment='spin {spin_number}']")
-                if spin_set is not None:
-                    kpoint_block = spin_set.find(f".//set[@comment='kpoint {kpoint_number}']")
-                    if kpoint_block is not None:
-                        block_values = []
-                        block_occu = []
-                        for child in kpoint_block:
-                            if child.text:
-                                columns = child.text.split()
-                                if len(columns) >= 2:
-                                    block_values.append(float(columns[0]))
-                                    block_occu.append(float(columns[1]))
-
-                        if block_values:
-                            self.energy_values.append(block_values)
-                        if block_occu:
-                            self.occupancy_list.append(block_occu)
-    
-    def IPR(self):
+                position = data.locate(spin_number, kpoint_number)
+                if position is not None:
+                    values = participation_ratio(data.read_projections(*position))
+
+                    band_numbers = [band_number for band_number in self.band_numbers if band_number in data.band_index]
+                    band_positions = [data.band_index[band_number] for band_number in band_numbers]
+                    self._add_block("projected", spin_number, kpoint_number, band_numbers, proj_ipr=values[band_positions])
+
+    def _add_block(self, kind, spin_number, kpoint_number, band_numbers, **values):
+        "Store the values of one (spin, kpoint) block as columns."
+        size = len(band_numbers)
+        block = {"spin": np.full(size, spin_number), "kpoint": np.full(size, kpoint_number), "band": np.asarray(band_numbers, dtype=int)}
+        block.update({name: np.asarray(column, dtype=float) for name, column in values.items()})
+        self.blocks[kind].append(block)
+
+    def IPR(self, window=None, bands=None, jobs=1, cache=False):
+        """IPR of the bands in the WAVECAR.
+
+        window: (emin, emax) in eV and bands: (first, last) band indices restrict the
+        bands read and transformed, by default all of them. With jobs > 1 the bands are
+        shared between worker processes (jobs=0 uses every core). With cache=True the
+        values are saved next to the WAVECAR and only the missing bands are computed.
+        """
+        wfc_factory, ipr_analyzer, tasks = self._ipr_tasks(window, bands)
+        self._add_ipr_blocks(wfc_factory, ipr_analyzer, tasks, jobs, cache)
+
+    def coarse_IPR(self, scale=0.5, samples=8, window=None, bands=None, jobs=1, cache=False):
+        """IPR on a coarser real-space grid for a quick screening.
+
+        scale: points per dimension relative to the full grid, the deviation from the
+        full grid is printed for 'samples' bands. The other arguments as in IPR().
+        """
+        wfc_factory, ipr_analyzer, tasks = self._ipr_tasks(window, bands, scale)
+        self._add_ipr_blocks(wfc_factory, ipr_analyzer, tasks, jobs, cache)
+        if samples:
+            self.grid_report(ipr_analyzer, tasks, samples)
+
+    def IPR_metrics(self, center=None, radii=(), window=None, bands=None, jobs=1, cache=False, scale=1.0):
+        """IPR, spread of |psi|^2 and fraction of |psi|^2 in spheres, from the same FFTs.
+
+        center: fractional position (e.g. from DefectAnalysis.defect_sites()) and radii (A)
+        of the spheres, without center only the spread is added (columns spread, sphere_<r>).
+        With cache=True every metric is saved, the sphere fractions for this center. scale < 1
+        uses a coarser grid as coarse_IPR(). The other arguments as in IPR().
+        """
+        wfc_factory, ipr_analyzer, tasks = self._ipr_tasks(window, bands, scale, center, radii)
+        self._add_ipr_blocks(wfc_factory, ipr_analyzer, tasks, jobs, cache, metrics=True)
+        if scale != 1.0:
+            self.grid_report(ipr_analyzer, tasks)
+
+    def _ipr_tasks(self, window=None, bands=None, scale=1.0, center=None, radii=()):
+        "WAVECAR opener, IPRAnalyzer and bands of every spin and k-point [(spin, kpoint, bands), ...]."
         # Initialize the VASP wavefunction object
         if self.gamma:
-            wfc = vaspwfc(self.wav_file, lgamma=True)
+            wfc_factory = partial(vaspwfc, self.wav_file, lgamma=True)
         else:
-            wfc = vaspwfc(self.wav_file)
+            wfc_factory = partial(vaspwfc, self.wav_file)
+        wfc = wfc_factory()
     
         if wfc._nspin == 2:
             spins = [1, 2]  # Spin-polarized calculation
         else:
             spins = [1]  # Non-spin-polarized calculation
 
-        self.results.append(f"{'Spin':<6} {'k-point':<10} {'Band':<10} {'IPR':<10}")
-
-        # Loop through all spins, k-points, and bands to calculate IPR
+        # Bands of every spin and k-point
+        tasks = []
         for spin in spins:
             for k in range(wfc._nkpts):  # k-points
-                for b in range(wfc._nbands):  # number of bands
-                    # Extract the real-space wavefunction for the current spin, k-point, and band
-                    psi_r = wfc.wfc_r(ispin=spin, ikpt=k+1, iband=b+1)
-                
-                    # Calculate |psi(r)|^2
-                    psi_squared = np.abs(psi_r)**2
-                
-                    # Calculate the numerator and denominator for IPR
-                    ipr_numerator = np.sum(psi_squared**2)  # Sum of |\Psi(r)|^4
-                    ipr_denominator = np.sum(psi_squared)**2  # (Sum of |\Psi(r)|^2)^2
-                
-                    ipr_value = ipr_numerator / ipr_denominator
-                
-                    self.results.append(f"{spin:<6} {k+1:<10} {b+1:<10} {ipr_value:<10.6f}")
-
-    def create_total_results(self):
-        "Create the total results with energy and occupancy values."
-        total_results = []
-        for i, result in enumerate(self.results):
-            if i == 0:
-                total_results.append(f"{result:<10} {'Energy':<10} {'Occ':<10}")
+                tasks.append((spin, k + 1, self.select_bands(wfc, spin, k + 1, window, bands)))
+
+        # Batched IPR: one stacked FFT per group of bands, within the memory budget
+        # The coefficients are read from the memory-mapped WAVECAR
+        ipr_analyzer = IPRAnalyzer(wfc, memory=self.memory, wavecar=WavecarReader(self.wav_file), scale=scale, center=center, radii=radii)
+        return wfc_factory, ipr_analyzer, tasks
+
+    def _add_ipr_blocks(self, wfc_factory, ipr_analyzer, tasks, jobs=1, cache=False, metrics=False):
+        "Compute the IPR (metrics=True: IPRAnalyzer.metrics) of the tasks and store them as blocks."
+        if cache:
+            # Values of the previous runs, only the missing bands are computed
+            wfc = ipr_analyzer.wfc
+            names = ipr_analyzer.metric_names if metrics else ["ipr"]
+            ipr_cache = IPRCache(self.wav_file, (wfc._nspin, wfc._nkpts, wfc._nbands), ipr_analyzer.ngrid, self.gamma,
+                                 names, ipr_analyzer.center)
+            missing = [(spin, kpoint, ipr_cache.missing(spin, kpoint, band_numbers)) for spin, kpoint, band_numbers in tasks]
+            if any(band_numbers for _, _, band_numbers in missing):
+                for (spin, kpoint, band_numbers), values in zip(missing, self._compute_ipr(ipr_analyzer, wfc_factory, missing, jobs, metrics)):
+                    ipr_cache.update(spin, kpoint, band_numbers, values)
+                ipr_cache.save()
+            block_values = [ipr_cache.get(*task) for task in tasks]
+        else:
+            block_values = self._compute_ipr(ipr_analyzer, wfc_factory, tasks, jobs, metrics)
+
+        for (spin, kpoint, band_numbers), values in zip(tasks, block_values):
+            self._add_block("ipr", spin, kpoint, band_numbers, **values)
+
+    def grid_report(self, ipr_analyzer, tasks, samples=8):
+        "Print how far the IPR on the coarse grid is from the full grid, for bands spread over the tasks."
+        all_bands = [(spin, kpoint, band) for spin, kpoint, band_numbers in tasks for band in band_numbers]
+        if not all_bands:
+            return
+        picks = np.unique(np.linspace(0, len(all_bands) - 1, min(samples, len(all_bands))).round().astype(int))
+        sample = [all_bands[i] for i in picks]
+        _, _, deviation = ipr_analyzer.deviation(sample)
+        worst = sample[int(np.argmax(deviation))]
+        grid = 'x'.join(map(str, ipr_analyzer.ngrid))
+        full_grid = 'x'.join(map(str, ipr_analyzer.full_grid))
+        print(f"IPR on the {grid} grid (full grid {full_grid}), deviation over {len(sample)} bands: "
+              f"mean {np.mean(deviation):.2%}, max {np.max(deviation):.2%} (spin {worst[0]}, kpoint {worst[1]}, band {worst[2]})")
+
+    def _compute_ipr(self, ipr_analyzer, wfc_factory, tasks, jobs=1, metrics=False):
+        "{'ipr': array} (metrics=True: IPRAnalyzer.metrics) of the tasks [(spin, kpoint, bands), ...], in the same order."
+        jobs = jobs or os.cpu_count() or 1
+        if jobs == 1:
+            return [ipr_analyzer.metrics(*task) if metrics else {"ipr": ipr_analyzer.ipr(*task)} for task in tasks]
+
+        # Chunks of bands, several per worker to balance the load
+        total = sum(len(band_numbers) for _, _, band_numbers in tasks)
+        chunk = max(ipr_analyzer.batch_size, -(-total // (4 * jobs)))
+        chunks = [(spin, kpoint, band_numbers[i:i + chunk]) for spin, kpoint, band_numbers in tasks
+                  for i in range(0, len(band_numbers), chunk)]
+        chunk_values = iter(parallel_ipr(wfc_factory, chunks, jobs, self.memory, self.wav_file, ipr_analyzer.scale,
+                                         ipr_analyzer.center, ipr_analyzer.radii, metrics))
+        # Merged back in the order of the tasks
+        results = []
+        for _, _, band_numbers in tasks:
+            parts = [next(chunk_values) for _ in range(0, len(band_numbers), chunk)]
+            if metrics:
+                results.append({name: np.concatenate([part[name] for part in parts] or [np.empty(0)]) for name in ipr_analyzer.metric_names})
             else:
-                block_index = (i - 1) // len(self.band_numbers)
-                row_index = (i - 1) % len(self.band_numbers)
-                energy_value = self.energy_values[block_index][row_index] if block_index < len(self.energy_values) and row_index < len(self.energy_values[block_index]) else ''
-                occupancy_value = self.occupancy_list[block_index][row_index] if block_index < len(self.occupancy_list) and row_index < len(self.occupancy_list[block_index]) else ''
-                total_results.append(f"{result:<10} {energy_value:<10.3f} {occupancy_value:<10.3f}")
+                results.append({"ipr": np.concatenate(parts or [np.empty(0)])})
+        return results
 
-                if row_index == len(self.band_numbers) - 1 and block_index < len(self.energy_values) - 1:
-                    total_results.append("")
+    def select_bands(self, wfc, spin, kpoint, window=None, bands=None):
+        "Band indices (1-based) of one (spin, kpoint) inside the energy window and the band range."
+        band_numbers = np.arange(1, wfc._nbands + 1)
+        if bands is not None:
+            first, last = bands
+            band_numbers = band_numbers[(band_numbers >= first) & (band_numbers <= last)]
+        if window is not None:
+            emin, emax = window
+            if self.data.eigenvalues is not None and self.data.locate(spin, kpoint) is not None:
+                in_window = np.array(self.data.band_numbers)[self.data.bands_in_window(spin, kpoint, emin, emax)]
+            else:
+                # Eigenvalues stored in the WAVECAR, one pass over the bands of the block
+                energies = wfc._bands[spin - 1, kpoint - 1]
+                in_window = np.flatnonzero((energies >= emin) & (energies <= emax)) + 1
+            band_numbers = band_numbers[np.isin(band_numbers, in_window)]
+        return band_numbers.tolist()
+
+    def create_results_table(self):
+        """DataFrame with the COLUMNS, one row per (spin, kpoint, band).
+
+        The energy and occupancy are looked up by (spin, kpoint, band) in the eigenvalue
+        array, the values not extracted (e.g. ipr without IPR()) are NaN.
+        """
+        frames = []
+        for kind in self.blocks:
+            blocks = self.blocks[kind]
+            if blocks:
+                frames.append(pd.DataFrame({name: np.concatenate([block[name] for block in blocks]) for name in blocks[0]}))
+        if not frames:
+            return pd.DataFrame({name: pd.Series(dtype=int if name in ("spin", "kpoint", "band") else float) for name in self.COLUMNS})
+
+        table = frames[0]
+        for frame in frames[1:]:
+            table = table.merge(frame, on=["spin", "kpoint", "band"], how="outer", sort=False)
+
+        # Energy and occupancy of each row
+        table["energy"] = np.nan
+        table["occupancy"] = np.nan
+        if self.data.eigenvalues is not None:
+            spin_positions = table["spin"].map(self.data.spin_index)
+            kpoint_positions = table["kpoint"].map(self.data.kpoint_index)
+            band_positions = table["band"].map(self.data.band_index)
+            found = (spin_positions.notna() & kpoint_positions.notna() & band_positions.notna()).values
+            eigenvalues = self.data.eigenvalues[spin_positions[found].astype(int).values, kpoint_positions[found].astype(int).values, band_positions[found].astype(int).values]
+            table.loc[found, "energy"] = eigenvalues[:, 0]
+            table.loc[found, "occupancy"] = eigenvalues[:, 1]
+
+        # Extra metrics (spread, sphere fractions) after the standard columns
+        return table.reindex(columns=list(self.COLUMNS) + [name for name in table.columns if name not in self.COLUMNS])
+
+    def create_total_results(self, table=None):
+        "Create the total results (text lines) with energy and occupancy values."
+        if table is None:
+            table = self.create_results_table()
+
+        # (column, header, decimals) of the extracted values
+        columns = []
+        if self.blocks["localization"]:
+            columns += [("tot", "tot", 3), ("sum", "sum", 3)]
+        if self.blocks["ipr"]:
+            columns += [("ipr", "IPR", 6)]
+        if self.blocks["projected"]:
+            columns += [("proj_ipr", "pIPR", 6)]
+        columns += [("energy", "Energy", 3), ("occupancy", "Occ", 3)]
+        columns += [(name, name.capitalize() if name == "spread" else name, 4) for name in table.columns if name not in self.COLUMNS]
+
+        total_results = [" ".join([f"{'Spin':<6} {'k-point':<10} {'Band':<10}"] + [f"{header:<10}" for _, header, _ in columns])]
+        for i, ((spin_number, kpoint_number), block) in enumerate(table.groupby(["spin", "kpoint"], sort=False)):
+            if i > 0:
+                total_results.append("")
+            values = zip(*(block[name].tolist() for name, _, _ in columns))
+            for band_number, row in zip(block["band"].tolist(), values):
+                total_results.append(" ".join([f"{spin_number:<6} {kpoint_number:<10} {band_number:<10}"] +
+                                              [f"{value:<10.{decimals}f}" for value, (_, _, decimals) in zip(row, columns)]))
 
         return total_results
 
@@ -127,3 +313,10 @@ class ResultsPrinter:
         total_results = self.results_extractor.create_total_results()
         for line in total_results:
             print(line)
+
+    def save_total_results(self, output_file, header=(), table=None):
+        "Write the header lines and the total results (table: create_results_table) to output_file."
+        with open(output_file, 'w') as f:
+            for line in header:
+                f.write(line + "\n")
+            f.write("\n".join(self.results_extractor.create_total_results(table)) + "\n")
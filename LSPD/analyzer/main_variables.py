@@ -1,12 +1,12 @@
 # Written by Joseph P.Vera
 # 2024-11
 
-from LSPD.reader.reader import VasprunReader
+from LSPD.reader.dataset import load_vasprun
 from fractions import Fraction
 
 class VariablesExtractor:
     def __init__(self, xml_reader):
-        self.root = xml_reader.get_root()
+        self.data = load_vasprun(xml_reader)
         self.spin_numbers = []
         self.kpoint_numbers = []
         self.band_numbers = []
@@ -15,50 +15,21 @@ class VariablesExtractor:
 
     def find_spin_numbers(self):
         """Finds unique spin numbers in the XML data."""
-        for spin_set in self.root.findall(".//set"):
-            comment = spin_set.get('comment')
-            if comment and comment.startswith('spin'):
-                spin_number = int(comment.replace('spin', ''))
-                if spin_number not in self.spin_numbers:
-                    self.spin_numbers.append(spin_number)
+        self.spin_numbers = list(self.data.spin_numbers)
 
     def find_kpoint_numbers(self):
         """Finds unique kpoint numbers for each spin."""
-        for spin_number in self.spin_numbers:
-            spin_set = self.root.find(f".//set[@comment='spin{spin_number}']")
-            if spin_set is not None:
-                for kpoint_set in spin_set.findall(".//set"):
-                    comment = kpoint_set.get('comment')
-                    if comment and comment.startswith('kpoint'):
-                        kpoint_number = int(comment.replace('kpoint ', ''))
-                        if kpoint_number not in self.kpoint_numbers:
-                            self.kpoint_numbers.append(kpoint_number)
+        self.kpoint_numbers = list(self.data.kpoint_numbers)
 
     def find_band_numbers(self):
         """Finds unique band numbers for each kpoint."""
-        for spin_number in self.spin_numbers:
-            spin_set = self.root.find(f".//set[@comment='spin{spin_number}']")
-            if spin_set is not None:
-                for kpoint_number in self.kpoint_numbers:
-                    kpoint_block = spin_set.find(f".//set[@comment='kpoint {kpoint_number}']")
-                    if kpoint_block is not None:
-                        for band_set in kpoint_block.findall(".//set"):
-                            comment = band_set.get('comment')
-                            if comment and comment.startswith('band'):
-                                band_number = int(comment.replace('band ', ''))
-                                if band_number not in self.band_numbers:
-                                    self.band_numbers.append(band_number)
+        self.band_numbers = list(self.data.band_numbers)
 
- 
     def extract_kpoint_coordinates(self):
         "Extract k-point coordinates from the XML tree."
         
-        kpointlist = self.root.find(".//varray[@name='kpointlist']")
-        
-        if kpointlist is not None:
-            for v in kpointlist.findall("v"):
-                coordinates = [float(coord) for coord in v.text.strip().split()]
-                self.kpoint_coordinates.append(coordinates)
+        if self.data.kpoint_coordinates is not None:
+            self.kpoint_coordinates = self.data.kpoint_coordinates.tolist()
         else:
             print("The <varray name='kpointlist'> tag was not found in the file.")
         
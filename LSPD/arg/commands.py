@@ -1,6 +1,9 @@
 # Written by Joseph P.Vera
 # 2025-02
 
+import sys
+import argparse
+
 class CommandLineArgs:
     def __init__(self):
         self.parser = argparse.ArgumentParser(description="Generate localized defect plots.")
@@ -10,6 +13,15 @@ class CommandLineArgs:
         self.parser.add_argument('--band', action='store_true', help="Display band numbers on the plot")
         self.parser.add_argument('--gamma', action='store_true', help="only for gamma calculations")
         self.parser.add_argument('--split', action='store_true', help="split the degenerate states")
+        self.parser.add_argument('--top', type=int, default=5, help="number of ions (tot closest to one) added in the 'sum' mode, by default 5")
+        self.parser.add_argument('--memory', type=int, default=64, help="memory (MB) for the batched IPR FFTs, by default 64")
+        self.parser.add_argument('--window', type=float, nargs=2, metavar=('EMIN', 'EMAX'), help="only the bands with energies (eV) in [EMIN, EMAX] for the IPR")
+        self.parser.add_argument('--bands', type=int, nargs=2, metavar=('FIRST', 'LAST'), help="only the bands FIRST to LAST for the IPR")
+        self.parser.add_argument('--jobs', type=int, default=1, help="worker processes for the IPR and the figures (folders in campaign.py), 0 uses every core, by default 1")
+        self.parser.add_argument('--coarse', type=float, default=1.0, help="points per dimension of the IPR grid relative to the full one (e.g. 0.5) for a quick screening")
+        self.parser.add_argument('--proj', action='store_true', help="atom-projected IPR from vasprun.xml, used when there is no WAVECAR")
+        self.parser.add_argument('--radii', type=float, nargs='*', metavar='R', help="also compute the spread of the states and the fraction within R (A) of the defect")
+        self.parser.add_argument('--force', action='store_true', help="campaign.py: run the scripts again even in the folders that are up to date")
         self.args = self.parser.parse_args()
 
     @property
@@ -27,3 +39,53 @@ class CommandLineArgs:
     @property
     def split_mode(self):
         return self.args.split  
+
+    @property
+    def top(self):
+        return self.args.top
+
+    @property
+    def memory(self):
+        return self.args.memory * 2**20
+
+    @property
+    def window(self):
+        return self.args.window
+
+    @property
+    def bands(self):
+        return self.args.bands
+
+    @property
+    def jobs(self):
+        return self.args.jobs
+
+    @property
+    def coarse(self):
+        return self.args.coarse
+
+    @property
+    def radii(self):
+        return self.args.radii
+
+    @property
+    def proj(self):
+        return self.args.proj
+
+    @property
+    def force(self):
+        return self.args.force
+
+    @property
+    def script_options(self):
+        "Options given on the command line without --jobs and --force, campaign.py passes them on to the scripts."
+        options = []
+        skip = False
+        for option in sys.argv[1:]:
+            if skip:
+                skip = False
+            elif option == '--jobs':
+                skip = True
+            elif option != '--force' and not option.startswith('--jobs='):
+                options.append(option)
+        return options
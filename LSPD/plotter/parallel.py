@@ -0,0 +1,142 @@
+# Localized-States contributors
+# 2026-10
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import matplotlib.pyplot as plt
+from LSPD.analyzer.energy_window import band_groups, table_precision
+from LSPD.analyzer.get_ipr import worker_context
+
+def _start_worker():
+    # Only files are written, no window is needed
+    plt.switch_backend('Agg')
+
+def render_blocks(plot_block, blocks, jobs=1):
+    """Call plot_block(*block) for every block, yields the results in the order of the blocks.
+
+    With jobs > 1 (0 uses every core) the figures are rendered by worker processes with the
+    non-interactive Agg backend. plot_block (e.g. a bound method of a plotter) and the blocks,
+    plain arrays, are sent to the workers.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(blocks) < 2:
+        for block in blocks:
+            yield plot_block(*block)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(blocks)), mp_context=worker_context(), initializer=_start_worker) as executor:
+        yield from executor.map(plot_block, *zip(*blocks))
+
+
+class BlockPlotter:
+    """One figure per (spin, kpoint) block of the results table: a value of every band against its energy.
+
+    Shared by LocalizedPlotter and IPRPlotter, they choose the column plotted, the y axis label
+    and the prefix of the figure files. AXIS_FONTSIZE is the font size of the axis labels.
+    """
+    AXIS_FONTSIZE = 14
+
+    def __init__(self, spin_numbers, kpoint_numbers, vbm, cbm, band_mode=False, res=0.0):
+        self.spin_numbers = spin_numbers
+        self.kpoint_numbers = kpoint_numbers
+        self.vbm = vbm
+        self.cbm = cbm
+        self.band_mode = band_mode
+        self.res = res
+        self.final_result = None
+
+    def store_final_results(self, results_table):
+        "Store the results table (ResultsExtractor.create_results_table) to plot."
+        self.final_result = results_table.copy()
+
+    def __getstate__(self):
+        "The rendering workers (jobs > 1) only need the settings, the blocks are sent as arrays."
+        state = self.__dict__.copy()
+        state['final_result'] = None
+        return state
+
+    def plot_blocks(self, column, ylabel, prefix='', jobs=1):
+        "Plot 'column' of the results table for every spin and kpoint. jobs > 1 renders the figures in parallel processes (0: every core)."
+        folder_name = os.path.basename(os.getcwd())
+        localized_folder = f'localized-defects/{folder_name}/Figures'
+        os.makedirs(localized_folder, exist_ok=True)
+
+        if not self.spin_numbers or not self.kpoint_numbers:
+            print("Error: Spin numbers or kpoint numbers are empty.")
+            return
+
+        # One (spin, kpoint) block of the table per figure
+        blocks = dict(tuple(self.final_result.groupby(['spin', 'kpoint'], sort=False)))
+
+        figures = []
+        for spin in self.spin_numbers:
+            for kpoint in self.kpoint_numbers:
+                if (spin, kpoint) in blocks:
+                    data = blocks[(spin, kpoint)]
+                    figures.append((spin, kpoint, data['energy'].values, data[column].values,
+                                    data['occupancy'].values, data['band'].values, localized_folder, ylabel, prefix))
+
+        for output_file in render_blocks(self._plot_block, figures, jobs):
+            print(f"Saved figure: {output_file}")
+
+    def _plot_block(self, spin, kpoint, energy_values, values, occupancies, bands, localized_folder, ylabel, prefix=''):
+        "Plot the bands of one (spin, kpoint) block (arrays), returns the figure file."
+        # Rescale the energy values
+        rescaled_energy = energy_values - self.res
+
+        # States inside the gap, one pass over the bands of the block. The gap test and the 0.1 eV
+        # groups of the labels use the energies rounded as in the results table, the points the raw ones
+        rounded_energy = table_precision(energy_values) - self.res
+        in_gap = np.flatnonzero((rounded_energy >= self.vbm - self.res) & (rounded_energy <= self.cbm - self.res))
+        band_numbers = bands[in_gap]
+        energies = rounded_energy[in_gap]
+
+        printed_bands = set()  # Track printed bands to avoid duplication
+
+        # Plotting
+        plt.figure(figsize=(10, 6))
+
+        # Occupancy class of every band: occupied (blue), unoccupied (red), partially occupied (green)
+        colors = np.where(occupancies > 0.9, 'blue', np.where(occupancies < 0.1, 'red', 'green'))
+
+        # One scatter call per occupancy class, stacked in the energy order of the classes
+        # (occupied, partially occupied, unoccupied), all below the VBM and CBM shading (zorder 1)
+        finite = np.isfinite(values)
+        for color, zorder in (('blue', 0.7), ('green', 0.8), ('red', 0.9)):
+            in_class = finite & (colors == color)
+            if in_class.any():
+                plt.scatter(rescaled_energy[in_class], values[in_class], marker='o', color=color, zorder=zorder)
+
+        # Band numbers next to the points: the bands in the gap within 0.1 eV, each group once
+        if self.band_mode:
+            for position, similar_bands in zip(in_gap, band_groups(energies, band_numbers, 0.1)):
+                if np.isfinite(values[position]) and similar_bands not in printed_bands:
+                    printed_bands.add(similar_bands)
+                    # Label next to scatter point
+                    plt.text(rescaled_energy[position] + 0.6, values[position], ', '.join(map(str, similar_bands)),
+                             fontsize=10, color='black')
+
+        # Legend
+        occupied_patch = plt.Line2D([0], [0], marker='o', color='w', label='Occupied', markerfacecolor='blue', markersize=10)
+        unoccupied_patch = plt.Line2D([0], [0], marker='o', color='w', label='Unoccupied', markerfacecolor='red', markersize=10)
+        partially_occupied_patch = plt.Line2D([0], [0], marker='o', color='w', label='Partially occupied', markerfacecolor='green', markersize=10)
+        vbm_patch = plt.Line2D([0], [0], color='lightblue', label='VBM')
+        cbm_patch = plt.Line2D([0], [0], color='thistle', label='CBM')
+        plt.legend(handles=[occupied_patch, unoccupied_patch, partially_occupied_patch, vbm_patch, cbm_patch])
+
+        # VBM and CBM shading
+        plt.axvspan(energy_values.min() - 0.9 - self.res, self.vbm - self.res, color='lightblue', alpha=0.4)
+        plt.axvspan(self.cbm - self.res, energy_values.max() + 0.9  + self.res, color='thistle', alpha=0.4)
+
+        plt.xlabel('Energy (eV)', fontsize=self.AXIS_FONTSIZE)
+        plt.ylabel(ylabel, fontsize=self.AXIS_FONTSIZE)
+        plt.xlim(energy_values.min() - 0.9 - self.res, energy_values.max() + 0.9 - self.res)
+
+        # Title and Save Plot
+        spin_name = 'up' if spin == 1 else 'down'
+        plt.title(f'Spin {spin_name} - kpoint {kpoint}', fontsize=14)
+        output_file = os.path.join(localized_folder, f'{prefix}Spin_{spin_name}-kpoint_{kpoint}.png')
+        plt.savefig(output_file, bbox_inches='tight', dpi=150)
+        plt.close()
+        return output_file
@@ -0,0 +1,78 @@
+# Localized-States contributors
+# 2026-10
+
+import hashlib
+import json
+import os
+import numpy as np
+
+def file_fingerprint(file_path, sample_size=1 << 20):
+    """Size, mtime and content hash of a file.
+
+    Only the first and last sample_size bytes are hashed, reading the whole
+    file would cost as much as parsing it again.
+    """
+    stat = os.stat(file_path)
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(sample_size))
+        if stat.st_size > sample_size:
+            f.seek(max(stat.st_size - sample_size, sample_size))
+            digest.update(f.read(sample_size))
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": digest.hexdigest()}
+
+
+class SidecarCache:
+    """Binary cache stored next to a source file.
+
+    The arrays are saved as .npy (or raw, for the memory-mapped ones) files in the
+    '<source>.lspd' folder together with a meta.json holding the fingerprint of the
+    source. The cache is only valid while the fingerprint (size, mtime and content
+    hash) still matches.
+    """
+    VERSION = 2
+
+    def __init__(self, source, suffix=".lspd"):
+        self.source = os.fspath(source)
+        self.folder = self.source + suffix
+        self.meta_file = os.path.join(self.folder, "meta.json")
+
+    def load_meta(self):
+        "Return the stored metadata, or None if the cache is missing or outdated."
+        try:
+            with open(self.meta_file) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != self.VERSION or meta.get("fingerprint") != file_fingerprint(self.source):
+            return None
+        return meta
+
+    def path(self, name, extension=".npy"):
+        return os.path.join(self.folder, f"{name}{extension}")
+
+    def invalidate(self):
+        "Create the folder and drop the metadata before writing new data into it."
+        os.makedirs(self.folder, exist_ok=True)
+        if os.path.exists(self.meta_file):
+            os.remove(self.meta_file)
+
+    def load(self, name, mmap_mode=None):
+        "Load one cached array."
+        return np.load(self.path(name), mmap_mode=mmap_mode)
+
+    def load_raw(self, name, dtype, shape):
+        "Memory-map a raw binary array written directly into the folder."
+        return np.memmap(self.path(name, ".raw"), dtype=dtype, mode='r', shape=tuple(shape))
+
+    def save(self, arrays, meta):
+        "Write the arrays and then the metadata, the cache becomes valid only at the end."
+        self.invalidate()
+        for name, values in arrays.items():
+            np.save(self.path(name), values)
+
+        meta = dict(meta, version=self.VERSION, fingerprint=file_fingerprint(self.source))
+        tmp_file = self.meta_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_file, self.meta_file)
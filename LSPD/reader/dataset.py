@@ -0,0 +1,252 @@
+# Localized-States contributors
+# 2026-10
+
+import os
+import tempfile
+import numpy as np
+from LSPD.reader.reader import VasprunStreamReader
+from LSPD.reader.cache import SidecarCache
+from LSPD.analyzer.energy_window import EnergyWindowIndex
+
+class VasprunData:
+    """Parsed content of vasprun.xml shared by every analyzer.
+
+    The file is read once and stored as dense arrays:
+        eigenvalues ----> [spin, kpoint, band, 2]   (energy, occupancy)
+        projections ----> [spin, kpoint, band, ion, orbital]   (float64, memory-mapped)
+        kpoint_coordinates ----> [kpoint, 3]
+    With cache=True the arrays are also saved in a binary sidecar next to the file
+    (vasprun.xml.lspd), later runs load it instead of parsing the XML again. The
+    sidecar is rebuilt automatically when vasprun.xml changes.
+    """
+    ARRAYS = ("eigenvalues", "kpoint_coordinates")
+    LISTS = ("spin_numbers", "kpoint_numbers", "band_numbers", "atoms", "orbitals")
+    FORMAT = 3  # layout of the sidecar written by this class
+
+    def __init__(self, xml_reader="vasprun.xml", cache=False):
+        self.spin_numbers = []
+        self.kpoint_numbers = []
+        self.band_numbers = []
+        self.kpoint_coordinates = None
+        self.atoms = []
+        self.orbitals = []
+        self.dielectric = {}
+        self.eigenvalues = None
+        self.projections = None
+        self._window_index = None
+
+        sidecar = None
+        if cache and isinstance(xml_reader, (str, os.PathLike)):
+            sidecar = SidecarCache(xml_reader)
+
+        if sidecar is None or not self._load_cache(sidecar):
+            if sidecar is not None:
+                try:
+                    sidecar.invalidate()
+                except OSError as error:
+                    print(f"Warning: the cache {sidecar.folder} could not be written ({error}).")
+                    sidecar = None
+
+            if not isinstance(xml_reader, VasprunStreamReader):
+                xml_reader = VasprunStreamReader(xml_reader)
+            self._build(xml_reader.iter_blocks(), sidecar)
+
+            if sidecar is not None:
+                self._save_cache(sidecar)
+
+        self._build_index()
+
+    def _build_index(self):
+        "Map the spin, kpoint and band numbers to their positions in the arrays."
+        self.spin_index = {number: i for i, number in enumerate(self.spin_numbers)}
+        self.kpoint_index = {number: i for i, number in enumerate(self.kpoint_numbers)}
+        self.band_index = {number: i for i, number in enumerate(self.band_numbers)}
+
+    def locate(self, spin_number, kpoint_number, band_number=None):
+        """Positions of a (spin, kpoint) block or of a (spin, kpoint, band) in the arrays.
+
+        Returns None if the block is not in the file.
+        """
+        if spin_number not in self.spin_index or kpoint_number not in self.kpoint_index:
+            return None
+        if band_number is None:
+            return self.spin_index[spin_number], self.kpoint_index[kpoint_number]
+        if band_number not in self.band_index:
+            return None
+        return self.spin_index[spin_number], self.kpoint_index[kpoint_number], self.band_index[band_number]
+
+    @property
+    def window_index(self):
+        "EnergyWindowIndex of the eigenvalues, built on first use."
+        if self._window_index is None:
+            self._window_index = EnergyWindowIndex(self.energies)
+        return self._window_index
+
+    def bands_in_window(self, spin_number, kpoint_number, emin, emax):
+        "Band positions of the (spin, kpoint) block with emin <= energy <= emax."
+        position = self.locate(spin_number, kpoint_number)
+        if position is None or self.eigenvalues is None:
+            return np.array([], dtype=int)
+        return self.window_index.bands_in_window(emin, emax, *position)
+
+    @property
+    def nspins(self):
+        return len(self.spin_numbers)
+
+    @property
+    def nkpoints(self):
+        return len(self.kpoint_numbers)
+
+    @property
+    def nbands(self):
+        return len(self.band_numbers)
+
+    def _load_cache(self, sidecar):
+        "Fill the dataset from the sidecar, returns False if it is missing or outdated."
+        meta = sidecar.load_meta()
+        if meta is None or meta.get("format") != self.FORMAT:
+            return False
+        try:
+            arrays = {name: sidecar.load(name) if name in meta["arrays"] else None for name in self.ARRAYS}
+            projections = None
+            if meta["projections"]:
+                projections = sidecar.load_raw("projections", ProjectionStore.DTYPE, meta["projections"])
+        except (OSError, ValueError) as error:
+            # Array files missing or truncated (write interrupted, files deleted): the caller
+            # invalidates the sidecar and parses vasprun.xml again
+            print(f"Warning: the cache {sidecar.folder} is incomplete ({error}), vasprun.xml is read again.")
+            return False
+        for name in self.LISTS:
+            setattr(self, name, meta[name])
+        for name, values in arrays.items():
+            setattr(self, name, values)
+        self.projections = projections
+        self.dielectric = meta["dielectric"]
+        return True
+
+    def _save_cache(self, sidecar):
+        arrays = {name: getattr(self, name) for name in self.ARRAYS if getattr(self, name) is not None}
+        meta = {name: getattr(self, name) for name in self.LISTS}
+        meta["arrays"] = [name for name in self.ARRAYS if getattr(self, name) is not None]
+        meta["dielectric"] = self.dielectric
+        meta["format"] = self.FORMAT
+        meta["projections"] = list(self.projections.shape) if self.projections is not None else None
+        try:
+            sidecar.save(arrays, meta)
+        except OSError as error:
+            print(f"Warning: the cache {sidecar.folder} could not be written ({error}).")
+
+    def _build(self, blocks, sidecar=None):
+        "Collect the streamed blocks and stack them into dense arrays."
+        eigen_blocks = {}
+        store = ProjectionStore(sidecar.path("projections", ".raw") if sidecar is not None else None)
+        for kind, key, values in blocks:
+            if kind == "eigenvalues":
+                eigen_blocks[key] = values
+            elif kind == "projected":
+                store.append(key, values)
+            elif kind == "kpointlist":
+                self.kpoint_coordinates = values
+            elif kind == "atoms":
+                self.atoms = list(values)
+            elif kind == "orbitals":
+                self.orbitals = list(values)
+            elif kind == "dielectric":
+                self.dielectric[key] = values
+
+        keys = list(eigen_blocks) + store.keys
+        self.spin_numbers = sorted({spin for spin, _ in keys})
+        self.kpoint_numbers = sorted({kpoint for _, kpoint in (store.keys or eigen_blocks)})
+
+        self.eigenvalues = self._stack(eigen_blocks)
+        self.projections = store.memmap(self.spin_numbers, self.kpoint_numbers)
+        nbands = self.projections.shape[2] if self.projections is not None else \
+            self.eigenvalues.shape[2] if self.eigenvalues is not None else 0
+        self.band_numbers = list(range(1, nbands + 1))
+
+    def _stack(self, blocks):
+        "Stack {(spin, kpoint): array} blocks, missing blocks are filled with NaN."
+        if not blocks:
+            return None
+        shape = next(iter(blocks.values())).shape
+        stacked = np.full((len(self.spin_numbers), len(self.kpoint_numbers)) + shape, np.nan)
+        for i, spin_number in enumerate(self.spin_numbers):
+            for j, kpoint_number in enumerate(self.kpoint_numbers):
+                block = blocks.get((spin_number, kpoint_number))
+                if block is not None:
+                    stacked[i, j] = block
+        return stacked
+
+    def read_projections(self, *index):
+        "Return projections[index], only the pages of the selected blocks are read."
+        return np.asarray(self.projections[index])
+
+    @property
+    def energies(self):
+        "Eigenvalues shaped [spin, kpoint, band]."
+        return self.eigenvalues[..., 0]
+
+    @property
+    def occupancies(self):
+        "Occupancies shaped [spin, kpoint, band]."
+        return self.eigenvalues[..., 1]
+
+
+class ProjectionStore:
+    """Append-only float64 storage of the <projected> blocks.
+
+    The values are kept as parsed, float64 gives back exactly the decimals written
+    in vasprun.xml. Every k-point block is written to disk as soon as it is parsed
+    and the whole array is memory-mapped at the end, the projections never have to
+    fit in RAM. Slicing [spin, kpoint, band] only reads the pages of that band.
+    """
+    DTYPE = np.float64
+
+    def __init__(self, file_path=None):
+        self.file_path = file_path
+        self.file = open(file_path, 'w+b') if file_path else tempfile.TemporaryFile()
+        self.keys = []
+        self.block_shape = None
+
+    def append(self, key, block):
+        "Write the [band, ion, orbital] block of one (spin, kpoint)."
+        if self.block_shape is None:
+            self.block_shape = block.shape
+        np.asarray(block, dtype=self.DTYPE).tofile(self.file)
+        self.keys.append(key)
+
+    def memmap(self, spin_numbers, kpoint_numbers):
+        "Return the blocks as a read-only [spin, kpoint, band, ion, orbital] memmap."
+        self.file.flush()
+        if not self.keys:
+            self.file.close()
+            return None
+
+        shape = (len(spin_numbers), len(kpoint_numbers)) + self.block_shape
+        blocks = np.memmap(self.file, dtype=self.DTYPE, mode='r', shape=(len(self.keys),) + self.block_shape)
+        self.file.close()
+        if self.keys == [(spin, kpoint) for spin in spin_numbers for kpoint in kpoint_numbers]:
+            return blocks.reshape(shape)
+
+        # Missing blocks: rearrange them, the absent ones are filled with NaN
+        target = self.file_path + ".tmp" if self.file_path else tempfile.TemporaryFile()
+        projections = np.memmap(target, dtype=self.DTYPE, mode='w+', shape=shape)
+        projections[:] = np.nan
+        position = {key: i for i, key in enumerate(self.keys)}
+        for i, spin_number in enumerate(spin_numbers):
+            for j, kpoint_number in enumerate(kpoint_numbers):
+                if (spin_number, kpoint_number) in position:
+                    projections[i, j] = blocks[position[(spin_number, kpoint_number)]]
+        projections.flush()
+        if self.file_path:
+            del projections, blocks
+            os.replace(target, self.file_path)
+            return np.memmap(self.file_path, dtype=self.DTYPE, mode='r', shape=shape)
+        return projections
+
+
+def load_vasprun(xml_reader="vasprun.xml"):
+    "Return xml_reader if it is already a VasprunData, otherwise parse it."
+    if isinstance(xml_reader, VasprunData):
+        return xml_reader
+    return VasprunData(xml_reader)
@@ -2,6 +2,7 @@
 # 2024-11
 
 import xml.etree.ElementTree as ET
+import numpy as np
 
 class VasprunReader:
     "Class for reading and parsing the vasprun.xml file."
@@ -12,3 +13,154 @@ class VasprunReader:
     def get_root(self):
         "Returns the root of the XML tree."
         return self.root
+
+
+class VasprunStreamReader:
+    """Class for reading the vasprun.xml file incrementally.
+
+    The file is never loaded as a whole DOM: every element is released right after
+    it has been processed, so the memory stays proportional to one k-point block.
+    An already parsed VasprunReader can also be given, its tree is walked as it is.
+    The blocks are delivered by iter_blocks() as (kind, key, values) tuples:
+        ('kpointlist', None, array[kpoint, 3])
+        ('atoms', None, [element symbols])
+        ('eigenvalues', (spin, kpoint), array[band, 2])       -> energy, occupancy
+        ('projected', (spin, kpoint), array[band, ion, orbital])
+        ('orbitals', None, [orbital names])
+        ('dielectric', name, [text of each <v> row])         -> as written by VASP
+    """
+    DIELECTRIC_TENSORS = ("epsilon", "epsilon_ion")
+
+    def __init__(self, xml_file):
+        self.xml_file = xml_file
+
+    def iter_blocks(self):
+        "Stream the file and yield the blocks as they are completed."
+        self._reset()
+        if isinstance(self.xml_file, VasprunReader):
+            for event, elem in self._walk(self.xml_file.get_root()):
+                if event == "start":
+                    self._start(elem)
+                else:
+                    yield from self._end(elem)
+            return
+
+        elements = []
+        for event, elem in ET.iterparse(self.xml_file, events=("start", "end")):
+            if event == "start":
+                elements.append(elem)
+                self._start(elem)
+            else:
+                yield from self._end(elem)
+                # Release the element: nothing keeps a reference to it afterwards
+                elements.pop()
+                if elements:
+                    elements[-1].remove(elem)
+                elem.clear()
+
+    @classmethod
+    def _walk(cls, elem):
+        "Generate the iterparse events of a tree that is already in memory."
+        yield "start", elem
+        for child in elem:
+            yield from cls._walk(child)
+        yield "end", elem
+
+    def _reset(self):
+        self._in_eigenvalues = 0
+        self._in_projected = 0
+        self._in_atoms = False
+        self._varray = None
+        self._spin = self._kpoint = None
+        self._rows, self._cells, self._bands = [], [], []
+        self._atoms, self._orbitals = [], []
+        self._seen = set()
+
+    def _start(self, elem):
+        tag = elem.tag
+        if tag == "set":
+            comment = elem.get("comment")
+            if comment:
+                if comment.startswith("spin"):
+                    self._spin = int(comment.replace("spin", ""))
+                elif comment.startswith("kpoint"):
+                    self._kpoint = int(comment.replace("kpoint ", ""))
+        elif tag == "eigenvalues":
+            self._in_eigenvalues += 1
+        elif tag == "projected":
+            self._in_projected += 1
+        elif tag == "varray":
+            name = elem.get("name")
+            if name == "kpointlist" or name in self.DIELECTRIC_TENSORS:
+                self._varray = name
+                self._rows = []
+        elif tag == "array" and elem.get("name") == "atoms":
+            self._in_atoms = True
+
+    def _end(self, elem):
+        tag = elem.tag
+        if tag == "r":
+            if self._in_eigenvalues or self._in_projected:
+                self._rows.append(elem.text)
+        elif tag == "v":
+            if self._varray:
+                self._rows.append(elem.text)
+        elif tag == "set":
+            comment = elem.get("comment")
+            if not comment:
+                return
+            if self._in_eigenvalues and comment.startswith("kpoint"):
+                # Same as root.find: the first eigenvalue block of each (spin, kpoint) wins
+                key = ("eigenvalues", self._spin, self._kpoint)
+                if key not in self._seen:
+                    self._seen.add(key)
+                    yield "eigenvalues", (self._spin, self._kpoint), self._to_array(self._rows)
+                self._rows = []
+            elif self._in_projected:
+                if comment.startswith("band"):
+                    self._bands.append(self._to_array(self._rows))
+                    self._rows = []
+                elif comment.startswith("kpoint"):
+                    key = ("projected", self._spin, self._kpoint)
+                    if key not in self._seen and self._bands:
+                        self._seen.add(key)
+                        yield "projected", (self._spin, self._kpoint), np.stack(self._bands)
+                    self._bands = []
+        elif tag == "field":
+            if self._in_projected and not self._in_eigenvalues and elem.text:
+                self._orbitals.append(elem.text.strip())
+        elif tag == "c":
+            if self._in_atoms:
+                self._cells.append(elem.text.strip() if elem.text else "")
+        elif tag == "rc":
+            if self._in_atoms and self._cells:
+                self._atoms.append(self._cells[0])
+                self._cells = []
+        elif tag == "varray":
+            name = self._varray
+            if name and elem.get("name") == name:
+                if ("varray", name) not in self._seen:
+                    self._seen.add(("varray", name))
+                    if name == "kpointlist":
+                        yield "kpointlist", None, self._to_array(self._rows)
+                    else:
+                        yield "dielectric", name, list(self._rows)
+                self._varray = None
+                self._rows = []
+        elif tag == "array":
+            if self._in_atoms and elem.get("name") == "atoms":
+                self._in_atoms = False
+                yield "atoms", None, self._atoms
+        elif tag == "eigenvalues":
+            self._in_eigenvalues -= 1
+        elif tag == "projected":
+            self._in_projected -= 1
+            if "orbitals" not in self._seen:
+                self._seen.add("orbitals")
+                yield "orbitals", None, self._orbitals
+
+    @staticmethod
+    def _to_array(rows):
+        "Convert the text of <r>/<v> rows into a 2D float array."
+        values = np.array(" ".join(rows).split(), dtype=float)
+        return values.reshape(len(rows), -1) if rows else values
@@ -0,0 +1,73 @@
+# Localized-States contributors
+# 2026-10
+
+import numpy as np
+
+class WavecarReader:
+    """Memory-mapped WAVECAR.
+
+    The file is made of records of recl bytes:
+        record 0 ----> recl, nspin, precision tag (45200 complex64, 45210 complex128)
+        record 1 ----> nkpoints, nbands, encut, cell (3x3)
+        then for every spin and k-point one header record (nplw, k-vector and
+        energy, -, occupancy of each band) followed by one record per band with
+        its nplw plane-wave coefficients.
+    Nothing is read when the object is created apart from the headers, the
+    coefficients are zero-copy views of the mapped file: only the pages of the
+    bands used are read, and processes mapping the same file share them.
+    """
+    PRECISION = {45200: np.complex64, 45210: np.complex128}
+
+    def __init__(self, file_path="WAVECAR"):
+        self.file_path = file_path
+        self.map = np.memmap(file_path, dtype=np.uint8, mode='r')
+
+        recl, nspin, tag = np.frombuffer(self.map, dtype=np.float64, count=3)
+        self.recl, self.nspin, tag = int(recl), int(nspin), int(tag)
+        if tag not in self.PRECISION:
+            raise ValueError(f"Invalid precision tag {tag} in {file_path}.")
+        self.dtype = np.dtype(self.PRECISION[tag])
+
+        header = np.frombuffer(self.map, dtype=np.float64, count=12, offset=self.recl)
+        self.nkpoints, self.nbands = int(header[0]), int(header[1])
+        self.encut = header[2]
+        self.cell = header[3:].reshape(3, 3)
+
+        required = self.record(self.nspin, self.nkpoints, self.nbands + 1) * self.recl
+        if self.map.size < required:
+            raise ValueError(f"{file_path} is truncated ({self.map.size} bytes, {required} expected).")
+
+        # Header of every (spin, kpoint)
+        self.nplws = np.zeros(self.nkpoints, dtype=int)
+        self.kvectors = np.zeros((self.nkpoints, 3))
+        self.energies = np.zeros((self.nspin, self.nkpoints, self.nbands))
+        self.occupancies = np.zeros((self.nspin, self.nkpoints, self.nbands))
+        for i in range(self.nspin):
+            for j in range(self.nkpoints):
+                values = np.frombuffer(self.map, dtype=np.float64, count=4 + 3 * self.nbands,
+                                       offset=self.record(i + 1, j + 1) * self.recl)
+                self.nplws[j] = int(values[0])
+                self.kvectors[j] = values[1:4]
+                self.energies[i, j] = values[4::3]
+                self.occupancies[i, j] = values[6::3]
+
+    def record(self, spin, kpoint, band=0):
+        "Record number of a (spin, kpoint, band), 1-based, band 0 is the header of the k-point."
+        return 2 + (spin - 1) * self.nkpoints * (self.nbands + 1) + (kpoint - 1) * (self.nbands + 1) + band
+
+    def band_block(self, spin, kpoint):
+        "Zero-copy [band, nplw] view of the coefficients of every band of a (spin, kpoint)."
+        return np.ndarray((self.nbands, self.nplws[kpoint - 1]), dtype=self.dtype, buffer=self.map,
+                          offset=self.record(spin, kpoint, 1) * self.recl, strides=(self.recl, self.dtype.itemsize))
+
+    def coefficients(self, spin, kpoint, bands):
+        """Coefficients [band, nplw] of the bands (1-based indices) of a (spin, kpoint).
+
+        A contiguous range of bands is returned as a view, other selections copy only
+        the bands asked for.
+        """
+        block = self.band_block(spin, kpoint)
+        bands = np.asarray(bands, dtype=int)
+        if bands.size and np.all(np.diff(bands) == 1):
+            return block[bands[0] - 1:bands[-1]]
+        return block[bands - 1]
@@ -2,20 +2,26 @@
 # Written by Joseph P.Vera
 # 2024-10
 
-from LSPD.reader.reader import VasprunReader
+from LSPD.reader.dataset import VasprunData
 from LSPD.analyzer.main_variables import VariablesExtractor
 from LSPD.analyzer.get_gap import GapAnalyzer
 
-# Read the file
-xml_reader = VasprunReader("vasprun.xml")
-extractor = VariablesExtractor(xml_reader)
+# Read the file once (or its cached arrays), every analyzer shares the same data
+vasprun_data = VasprunData("vasprun.xml", cache=True)
+extractor = VariablesExtractor(vasprun_data)
 
 extractor.find_spin_numbers()
 extractor.find_kpoint_numbers()
 extractor.find_band_numbers()
 
-analyzer = GapAnalyzer(extractor.spin_numbers, extractor.kpoint_numbers)
+# A band is occupied with occupancy 1.000 and empty with 0.000, change occupied/unoccupied/tolerance to relax it.
+analyzer = GapAnalyzer(extractor.spin_numbers, extractor.kpoint_numbers, xml_reader=vasprun_data)
 analyzer.analyze()
 vbm, cbm = analyzer.get_results()
+vbm_location, cbm_location = analyzer.get_locations()
 print(f"VBM: {vbm}, CBM: {cbm}")
 print(f"Bandgap = {cbm - vbm}")
+if vbm_location:
+    print(f"VBM at spin {vbm_location[0]}, kpoint {vbm_location[1]}, band {vbm_location[2]}")
+if cbm_location:
+    print(f"CBM at spin {cbm_location[0]}, kpoint {cbm_location[1]}, band {cbm_location[2]}")
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+# Localized-States contributors
+# 2026-10
+
+import os
+from LSPD.analyzer.campaign import CampaignRunner
+from LSPD.arg.commands import CommandLineArgs
+
+"Run the analyses in every defect folder (vasprun.xml or POSCAR) below the current folder, except perfect"
+
+# The options (e.g. --tot, --band, --split) are passed on to every script, --jobs N processes N folders at the same time. The folders already analyzed with the same files and options, whose outputs are still there, are skipped, use --force to run them again.
+args = CommandLineArgs()
+
+# Folder with the defect folders (one per defect and charge state)
+base_directory = '.'
+
+# Scripts to run in each folder, e.g. add "ipr.py". Each one uses its own VBM and CBM variables.
+package_directory = os.path.dirname(os.path.abspath(__file__))
+scripts = ["locplot.py", "eigenplot.py", "localized.py", "defects.py"]
+
+runner = CampaignRunner(base_directory, [os.path.join(package_directory, script) for script in scripts], args.script_options, args.jobs, args.force)
+runner.run()
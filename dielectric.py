@@ -2,10 +2,11 @@
 # Written by Joseph P.Vera
 # 2024-11
 
-from LSPD.reader.reader import VasprunReader
+from LSPD.reader.reader import VasprunStreamReader
 from LSPD.analyzer.get_dielectric import DielectricAnalyzer
 
-xml_reader = VasprunReader("vasprun.xml")
+# Stream the file, only the dielectric tensors are kept in memory
+xml_reader = VasprunStreamReader("vasprun.xml")
 
 parser = DielectricAnalyzer(xml_reader)
 
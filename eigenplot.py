@@ -2,7 +2,7 @@
 # Written by Joseph P.Vera
 # 2025-02
 
-from LSPD.reader.reader import VasprunReader
+from LSPD.reader.dataset import VasprunData
 from LSPD.analyzer.main_variables import VariablesExtractor
 from LSPD.analyzer.get_results import ResultsExtractor
 from LSPD.plotter.eigen_plotter import EigenvaluesPlotter
@@ -19,11 +19,11 @@ cbm = 12.5198 # AEXX = 0.25 (AEXX = 0.33 --> 12.7609)
 # res is optional to rescale the Kohn-Sham (eigenvalues) plot with respect to VBM, it may also be off.
 res = 0
 
-# Read the file
-xml_reader = VasprunReader("vasprun.xml")
+# Read the file once (or its cached arrays), every analyzer shares the same data
+vasprun_data = VasprunData("vasprun.xml", cache=True)
 
 # Prepare the vasprun.xml file to parse
-vasp_data = VariablesExtractor(xml_reader)
+vasp_data = VariablesExtractor(vasprun_data)
 
 # Find the main variables in vasprun.xml file: spin, kpoints and bands.
 vasp_data.find_spin_numbers()
@@ -31,14 +31,13 @@ vasp_data.find_kpoint_numbers()
 vasp_data.find_band_numbers()
 
 # Prepare the extraction results with the main variables
-results_extractor = ResultsExtractor(vasp_data.spin_numbers, vasp_data.kpoint_numbers, vasp_data.band_numbers)
+results_extractor = ResultsExtractor(vasp_data.spin_numbers, vasp_data.kpoint_numbers, vasp_data.band_numbers, xml_reader=vasprun_data, top=args.top)
 
-# Extract results (spin, kpoint, band, tot, sum) from PROCAR and energy_occupancy (energy, occupancy) from EIGENVAL in columns.
+# Extract results (spin, kpoint, band, tot, sum) from PROCAR in columns.
 results_extractor.extract_results()
-results_extractor.extract_energy_occupancy()
 
-# Merge the results and energy_occupancy in one list to plot.
-total_results = results_extractor.create_total_results()
+# Table of the results with the energy and occupancy (EIGENVAL) of each band.
+results_table = results_extractor.create_results_table()
 
 # Extract k-point coordinates and labels for x-axis as xticks to plot .
 vasp_data.extract_kpoint_coordinates()
@@ -47,8 +46,8 @@ vasp_data.generate_x_labels()
 # Prepare the plotter by declaring its variables
 plotter = EigenvaluesPlotter(vbm, cbm, vasp_data.kpoint_numbers, vasp_data.generate_x_labels, res, args.band_mode, args.split_mode)
 
-# Use the total_results list to plot
-plotter.store_final_results(total_results)
+# Use the results table to plot
+plotter.store_final_results(results_table)
 
 # Plot the Kohn-Sham states
 plotter.plot_eigenvalues()
@@ -1,13 +1,13 @@
 #!/usr/bin/env python3
 
-from LSPD.reader.reader import VasprunReader
+from LSPD.reader.dataset import VasprunData
 from LSPD.analyzer.main_variables import VariablesExtractor
 
-# Read the file
-xml_reader = VasprunReader("vasprun.xml")
+# Read the file once (or its cached arrays), every analyzer shares the same data
+vasprun_data = VasprunData("vasprun.xml", cache=True)
 
 # Prepare the vasprun.xml file to parse
-extractor = VariablesExtractor(xml_reader)
+extractor = VariablesExtractor(vasprun_data)
 
 # Find the main variables in vasprun.xml file: spin, kpoints and bands.
 extractor.find_spin_numbers()
@@ -2,9 +2,11 @@
 # Written by Joseph P.Vera
 # 2024-11
 
-from LSPD.reader.reader import VasprunReader
+import os
+from LSPD.reader.dataset import VasprunData
 from LSPD.analyzer.main_variables import VariablesExtractor
-from LSPD.analyzer.get_results import ResultsExtractor
+from LSPD.analyzer.get_results import ResultsExtractor, ResultsPrinter
+from LSPD.analyzer.get_defects import DefectAnalysis
 from LSPD.plotter.ipr_plotter import IPRPlotter
 from LSPD.arg.commands import CommandLineArgs
 
@@ -16,11 +18,11 @@ cbm = 11.7449
 
 res=vbm
 
-# Read the file
-xml_reader = VasprunReader("vasprun.xml")
+# Read the file once (or its cached arrays), every analyzer shares the same data
+vasprun_data = VasprunData("vasprun.xml", cache=True)
 
 # Prepare the vasprun.xml file to parse
-vasp_data = VariablesExtractor(xml_reader)
+vasp_data = VariablesExtractor(vasprun_data)
 
 # Find the main variables in vasprun.xml file: spin, kpoints and bands.
 vasp_data.find_spin_numbers()
@@ -28,20 +30,51 @@ vasp_data.find_kpoint_numbers()
 vasp_data.find_band_numbers()
 
 # Prepare the extraction results with the main variables
-results_extractor = ResultsExtractor(vasp_data.spin_numbers, vasp_data.kpoint_numbers, vasp_data.band_numbers, args.gamma)
+results_extractor = ResultsExtractor(vasp_data.spin_numbers, vasp_data.kpoint_numbers, vasp_data.band_numbers, args.gamma, xml_reader=vasprun_data, memory=args.memory)
 
-# Extract results (spin, kpoint, band, IPR) and energy_occupancy (energy, occupancy) values in columns.
-results_extractor.IPR()
-results_extractor.extract_energy_occupancy()
+# Without WAVECAR (or with --proj) the atom-projected IPR is computed from the projections in vasprun.xml instead, for every band at once.
+quantity = "proj_ipr" if args.proj or not os.path.exists("WAVECAR") else "ipr"
+if quantity == "proj_ipr":
+    print("Atom-projected IPR from vasprun.xml (no WAVECAR or --proj).")
+    results_extractor.projected_IPR()
+else:
+    # Extract results (spin, kpoint, band, IPR) values in columns. Use --window EMIN EMAX (eV) or --bands FIRST LAST to compute only those bands, and --jobs N to use N processes. The values are kept in WAVECAR.lspd, later runs only compute the missing bands. --coarse 0.5 uses half the grid points per dimension for a quick screening.
+    # --radii R1 R2 ... (A) also computes the spread of each state and the fraction of |psi|^2 within R of the defect, found by comparing POSCAR with ../perfect/POSCAR (the first one if there are several).
+    if args.radii is not None:
+        center = None
+        if args.radii:
+            defect_sites = DefectAnalysis("POSCAR", "../perfect/POSCAR").defect_sites()
+            if defect_sites:
+                center = defect_sites[0]
+            else:
+                print("No defect found, only the spread is computed.")
+        results_extractor.IPR_metrics(center, args.radii, window=args.window, bands=args.bands, jobs=args.jobs, cache=True,
+                                      scale=args.coarse)
+    elif args.coarse != 1.0:
+        results_extractor.coarse_IPR(args.coarse, window=args.window, bands=args.bands, jobs=args.jobs, cache=True)
+    else:
+        results_extractor.IPR(window=args.window, bands=args.bands, jobs=args.jobs, cache=True)
 
-# Merge the results and energy_occupancy in one list to plot.
-total_results = results_extractor.create_total_results()
+# Table of the results with the energy and occupancy (EIGENVAL) of each band.
+results_table = results_extractor.create_results_table()
+
+# With --radii the IPR, energy, occupancy, spread and sphere fractions of every band are saved in localized-defects/<folder>/Data/ipr_metrics.dat
+if quantity == "ipr" and args.radii is not None:
+    folder_name = os.path.basename(os.getcwd())
+    localized_folder = f'localized-defects/{folder_name}/Data'
+    os.makedirs(localized_folder, exist_ok=True)
+    output_file = os.path.join(localized_folder, 'ipr_metrics.dat')
+    header = [f"Defect: {folder_name}", "", f"VBM = {vbm} eV", f"CBM = {cbm} eV"]
+    if center is not None:
+        header.append(f"Defect site = {' '.join(f'{x:.6f}' for x in center)} (fractional), radii = {' '.join(f'{r:g}' for r in args.radii)} A")
+    ResultsPrinter(results_extractor).save_total_results(output_file, header + ["", ""], results_table)
+    print(f"Data saved to {output_file}")
 
 # Prepare the plotter by declaring its variables
 plotter = IPRPlotter(vasp_data.spin_numbers, vasp_data.kpoint_numbers, vbm, cbm, args.band_mode, res)
 
-# Use the total_results list to plot
-plotter.store_final_results(total_results)
+# Use the results table to plot
+plotter.store_final_results(results_table)
 
-# Plot the localized states
-plotter.plot_ipr()
+# Plot the localized states, --jobs N also renders the figures of the k-points in N processes
+plotter.plot_ipr(quantity, jobs=args.jobs)
@@ -3,7 +3,7 @@
 # 2024-11
 
 import os
-from LSPD.reader.reader import VasprunReader
+from LSPD.reader.dataset import VasprunData
 from LSPD.analyzer.main_variables import VariablesExtractor
 from LSPD.analyzer.localized_results import VasprunParser
 
@@ -13,11 +13,11 @@ from LSPD.analyzer.localized_results import VasprunParser
 vbm = 7.2945  
 cbm = 11.7449
 
-# Read the file
-xml_reader = VasprunReader("vasprun.xml")
+# Read the file once (or its cached arrays), every analyzer shares the same data
+vasprun_data = VasprunData("vasprun.xml", cache=True)
 
 # Prepare the vasprun.xml file to parse
-vasp_data = VariablesExtractor(xml_reader)
+vasp_data = VariablesExtractor(vasprun_data)
 
 # Find the main variables in vasprun.xml file: spin, kpoints and bands.
 vasp_data.find_spin_numbers()
@@ -28,11 +28,10 @@ vasp_data.find_band_numbers()
 filter_occupancy = None  
 
 # Prepare 
-parser = VasprunParser(vbm, cbm, vasp_data.spin_numbers, vasp_data.kpoint_numbers, filter_occupancy)
+parser = VasprunParser(vbm, cbm, vasp_data.spin_numbers, vasp_data.kpoint_numbers, filter_occupancy, xml_reader=vasprun_data)
 
-# Get information same to the EIGENVAL and PROCAR files, but in vasprun.xml file.
+# Get information same to the EIGENVAL file, but in vasprun.xml file.
 parser.parse_eigenval()
-parser.parse_procar()
 
 # Save the information
 folder_name = os.path.basename(os.getcwd())
@@ -53,6 +52,7 @@ with open(output_file, 'w') as f:
     f.write("\n\n\n\n########################################################################\n")
     f.write("                  vasprun.xml file (PROCAR information)\n")
     f.write("########################################################################\n")
-    f.write("\n".join(parser.vasprun_val) + "\n")
+    # PROCAR information, written to the file while it is generated
+    parser.parse_procar(f)
 
 print(f"Data saved to {output_file}")
@@ -2,7 +2,7 @@
 # Written by Joseph P.Vera
 # 2025-02
 
-from LSPD.reader.reader import VasprunReader
+from LSPD.reader.dataset import VasprunData
 from LSPD.analyzer.main_variables import VariablesExtractor
 from LSPD.analyzer.get_results import ResultsExtractor
 from LSPD.plotter.loc_plotter import LocalizedPlotter
@@ -10,7 +10,7 @@ from LSPD.arg.commands import CommandLineArgs
 
 "Plot the localization states in each kpoint"
 
-# Use --tot command for plot: Energy versus tot column (PROCAR). By default plot: Energy versus sum (the 5 heaviest values from tot (each band)).
+# Use --tot command for plot: Energy versus tot column (PROCAR). By default plot: Energy versus sum (the 5 heaviest values from tot (each band), --top changes that number).
 args = CommandLineArgs()
 
 # Variables following the valence band maximum (VBM) and conduction band minimum (CBM).
@@ -20,11 +20,11 @@ cbm = 12.5198 # AEXX = 0.25 (AEXX = 0.33 --> 12.7609)
 # res is optional to rescale the energy
 res = 0
 
-# Read the file
-xml_reader = VasprunReader("vasprun.xml")
+# Read the file once (or its cached arrays), every analyzer shares the same data
+vasprun_data = VasprunData("vasprun.xml", cache=True)
 
 # Prepare the vasprun.xml file to parse
-vasp_data = VariablesExtractor(xml_reader)
+vasp_data = VariablesExtractor(vasprun_data)
 
 # Find the main variables in vasprun.xml file: spin, kpoints and bands.
 vasp_data.find_spin_numbers()
@@ -32,20 +32,19 @@ vasp_data.find_kpoint_numbers()
 vasp_data.find_band_numbers()
 
 # Prepare the extraction results with the main variables
-results_extractor = ResultsExtractor(vasp_data.spin_numbers, vasp_data.kpoint_numbers, vasp_data.band_numbers)
+results_extractor = ResultsExtractor(vasp_data.spin_numbers, vasp_data.kpoint_numbers, vasp_data.band_numbers, xml_reader=vasprun_data, top=args.top)
 
-# Extract results (spin, kpoint, band, tot, sum) and energy_occupancy (energy, occupancy) values in columns.
+# Extract results (spin, kpoint, band, tot, sum) values in columns.
 results_extractor.extract_results()
-results_extractor.extract_energy_occupancy()
 
-# Merge the results and energy_occupancy in one list to plot.
-total_results = results_extractor.create_total_results()
+# Table of the results with the energy and occupancy (EIGENVAL) of each band.
+results_table = results_extractor.create_results_table()
 
 # Prepare the plotter by declaring its variables
 plotter = LocalizedPlotter(vasp_data.spin_numbers, vasp_data.kpoint_numbers, vbm, cbm, args.tot_mode, args.band_mode, res)
 
-# Use the total_results list to plot
-plotter.store_final_results(total_results)
+# Use the results table to plot
+plotter.store_final_results(results_table)
 
-# Plot the localized states
-plotter.plot_localized()
+# Plot the localized states, --jobs N renders the figures of the k-points in N processes
+plotter.plot_localized(jobs=args.jobs)
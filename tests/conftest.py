@@ -0,0 +1,161 @@
+# Localized-States contributors
+# 2026-10
+
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write_vasprun(path, nspin=2, nkpoints=2, nbands=12, nions=6, seed=0):
+    """Small vasprun.xml with eigenvalues, projections (s, p, d) and dielectric tensors.
+
+    Returns the energies, occupancies [spin, kpoint, band] and projections
+    [spin, kpoint, band, ion, orbital] written, with the decimals of the file.
+    """
+    rng = np.random.default_rng(seed)
+    energies = np.round(np.sort(rng.uniform(-5, 15, size=(nspin, nkpoints, nbands)), axis=-1), 4)
+    occupancies = np.where(energies < 7.0, 1.0, 0.0)
+    occupancies[0, 0, nbands // 2] = 0.5062
+    projections = np.round(rng.uniform(0, 0.4, size=(nspin, nkpoints, nbands, nions, 3)), 4)
+
+    lines = ['<?xml version="1.0" encoding="ISO-8859-1"?>', '<modeling>', ' <kpoints>', '  <varray name="kpointlist" >']
+    lines += [f'   <v>       {0.5 * k:.8f}       0.00000000       {0.25 * k:.8f} </v>' for k in range(nkpoints)]
+    lines += ['  </varray>', ' </kpoints>', ' <atominfo>', f'  <atoms>       {nions} </atoms>', '  <array name="atoms" >',
+              '   <dimension dim="1">ion</dimension>', '   <field type="string">element</field>',
+              '   <field type="int">atomtype</field>', '   <set>']
+    lines += [f'    <rc><c>{"B " if i < nions // 2 else "N "}</c><c>   {1 if i < nions // 2 else 2}</c></rc>' for i in range(nions)]
+    lines += ['   </set>', '  </array>', ' </atominfo>', ' <calculation>']
+
+    def eigenvalues(indent):
+        block = [indent + '<eigenvalues>', indent + ' <array>', indent + '  <dimension dim="1">band</dimension>',
+                 indent + '  <field>eigene</field>', indent + '  <field>occ</field>', indent + '  <set>']
+        for s in range(nspin):
+            block.append(indent + f'   <set comment="spin {s + 1}">')
+            for k in range(nkpoints):
+                block.append(indent + f'    <set comment="kpoint {k + 1}">')
+                block += [indent + f'     <r>  {energies[s, k, b]:9.4f}   {occupancies[s, k, b]:.4f} </r>' for b in range(nbands)]
+                block.append(indent + '    </set>')
+            block.append(indent + '   </set>')
+        return block + [indent + '  </set>', indent + ' </array>', indent + '</eigenvalues>']
+
+    lines += eigenvalues('  ')
+    lines += ['  <projected>'] + eigenvalues('   ')
+    lines += ['   <array>', '    <dimension dim="1">ion</dimension>', '    <field>s</field>', '    <field>p</field>',
+              '    <field>d</field>', '    <set>']
+    for s in range(nspin):
+        lines.append(f'     <set comment="spin{s + 1}">')
+        for k in range(nkpoints):
+            lines.append(f'      <set comment="kpoint {k + 1}">')
+            for b in range(nbands):
+                lines.append(f'       <set comment="band {b + 1}">')
+                lines += ['        <r> ' + ' '.join(f'{x:.4f}' for x in projections[s, k, b, i]) + ' </r>' for i in range(nions)]
+                lines.append('       </set>')
+            lines.append('      </set>')
+        lines.append('     </set>')
+    lines += ['    </set>', '   </array>', '  </projected>']
+    for name in ('epsilon', 'epsilon_ion'):
+        lines.append(f'  <varray name="{name}" >')
+        lines += ['   <v> ' + ' '.join(f'{(4.5 if r == c else 0.0):16.8f}' for c in range(3)) + ' </v>' for r in range(3)]
+        lines.append('  </varray>')
+    lines += [' </calculation>', '</modeling>']
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return energies, occupancies, projections
+
+
+def plane_waves(cell, encut, kvector, gamma=False):
+    "G vectors inside the cutoff and FFT grid, in the order of the WAVECAR records (as vaspwfc.gvectors)."
+    reciprocal = np.linalg.inv(cell).T
+    cutoff = np.ceil(np.sqrt(encut / 3.8099821114) / (2 * np.pi / (np.linalg.norm(cell, axis=1) / 0.529177249)))
+    ngrid = np.array(2 * cutoff + 1, dtype=int)
+    fx, fy, fz = [np.arange(n, dtype=int) for n in ngrid]
+    for f, n in zip((fx, fy, fz), ngrid):
+        f[n // 2 + 1:] -= n
+    gz, gy, gx = np.array(np.meshgrid(fz, fy, fx, indexing='ij')).reshape((3, -1))
+    grid = np.array([gx, gy, gz], dtype=float).T
+    if gamma:
+        grid = grid[(gx > 0) | ((gx == 0) & (gy > 0)) | ((gx == 0) & (gy == 0) & (gz >= 0))]
+    energy = 3.8099821114 * np.linalg.norm((grid + kvector) @ (2 * np.pi * reciprocal), axis=1) ** 2
+    return np.asarray(grid[energy < encut], dtype=int), ngrid
+
+
+class WavecarFile:
+    """WAVECAR written by write_wavecar: the records and the wavefunction interface read by IPRAnalyzer.
+
+    Stands for the vaspwfc object of the file (the attributes and methods IPRAnalyzer uses),
+    the coefficients come from the records written.
+    """
+    def __init__(self, path, cell, encut, kvectors, coefficients, energies, gamma):
+        self.path = path
+        self._Acell = cell
+        self._nspin, self._nkpts, self._nbands = energies.shape
+        self._lgam = gamma
+        self._lsoc = False
+        self._gam_half = 'x'
+        self._bands = energies
+        self.kvectors = kvectors
+        self.coefficients = coefficients  # [spin][kpoint] -> [band, nplw]
+        self._gvectors = [plane_waves(cell, encut, kvector, gamma)[0] for kvector in kvectors]
+        self._ngrid = plane_waves(cell, encut, kvectors[0], gamma)[1]
+
+    def __call__(self):
+        return self
+
+    def gvectors(self, ikpt):
+        return self._gvectors[ikpt - 1]
+
+    def readBandCoeff(self, ispin, ikpt, iband):
+        return self.coefficients[ispin - 1][ikpt - 1][iband - 1].astype(np.complex128)
+
+
+def write_wavecar(path, nspin=2, nkpoints=2, nbands=6, a=6.0, encut=60.0, gamma=False, seed=0, precision=np.complex64):
+    "Small WAVECAR with random normalized coefficients, returns its WavecarFile."
+    rng = np.random.default_rng(seed)
+    cell = np.diag([a, a * 1.1, a * 0.9])
+    kvectors = np.zeros((nkpoints, 3)) if gamma else rng.uniform(-0.5, 0.5, size=(nkpoints, 3)) * (np.arange(nkpoints)[:, None] > 0)
+    nplws = [len(plane_waves(cell, encut, kvector, gamma)[0]) for kvector in kvectors]
+    recl = max(max(nplws) * np.dtype(precision).itemsize, (4 + 3 * nbands) * 8, 15 * 8)
+    records = bytearray((2 + nspin * nkpoints * (nbands + 1)) * recl)
+
+    def put(record, values):
+        data = np.asarray(values).tobytes()
+        records[record * recl:record * recl + len(data)] = data
+
+    put(0, np.array([recl, nspin, 45200 if precision == np.complex64 else 45210], dtype=np.float64))
+    put(1, np.concatenate([[nkpoints, nbands, encut], cell.ravel()]).astype(np.float64))
+    energies = np.zeros((nspin, nkpoints, nbands))
+    coefficients = []
+    for s in range(nspin):
+        coefficients.append([])
+        for k in range(nkpoints):
+            record = 2 + s * nkpoints * (nbands + 1) + k * (nbands + 1)
+            energies[s, k] = np.sort(rng.uniform(-5, 5, nbands))
+            header = np.zeros((nbands, 3))
+            header[:, 0] = energies[s, k]
+            header[:, 2] = energies[s, k] < 0
+            put(record, np.concatenate([[nplws[k]], kvectors[k], header.ravel()]))
+            block = rng.normal(size=(nbands, nplws[k])) + 1j * rng.normal(size=(nbands, nplws[k]))
+            # Some bands more localized than others
+            block *= np.exp(-rng.uniform(0, 0.05, size=(nbands, 1)) * np.arange(nplws[k]))
+            if gamma:
+                block[:, 0] = block[:, 0].real
+            block = (block / np.linalg.norm(block, axis=1, keepdims=True)).astype(precision)
+            for b in range(nbands):
+                put(record + 1 + b, block[b])
+            coefficients[-1].append(block)
+    with open(path, 'wb') as f:
+        f.write(bytes(records))
+    return WavecarFile(path, cell, encut, kvectors, coefficients, energies, gamma)
+
+
+@pytest.fixture
+def vasprun(tmp_path):
+    "Path of a small vasprun.xml and the values written in it."
+    path = tmp_path / "vasprun.xml"
+    energies, occupancies, projections = write_vasprun(path)
+    return path, energies, occupancies, projections
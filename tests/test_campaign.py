@@ -0,0 +1,71 @@
+# Localized-States contributors
+# 2026-10
+
+import os
+import json
+from LSPD.analyzer.campaign import CampaignRunner
+
+# Stand-ins of the scripts with the same names: they write the outputs listed in CampaignRunner.OUTPUTS
+SCRIPT = """import os, sys
+name = os.path.basename(os.getcwd())
+os.makedirs(f'localized-defects/{name}/Data', exist_ok=True)
+with open(f'localized-defects/{name}/Data/localized_{name}.dat', 'w') as f:
+    f.write(' '.join(sys.argv[1:]))
+"""
+
+
+def make_tree(base):
+    for folder in ("perfect", "Va_A", "Va_B"):
+        os.makedirs(base / folder)
+        (base / folder / "vasprun.xml").write_text("<modeling/>")
+    script = base / "scripts" / "localized.py"
+    os.makedirs(script.parent)
+    script.write_text(SCRIPT)
+    return str(script)
+
+
+def statuses(runner):
+    return {os.path.basename(folder): status["localized.py"] for folder, status in runner.run().items()}
+
+
+def test_perfect_is_not_a_defect_folder(tmp_path):
+    make_tree(tmp_path)
+    # Nor the folders inside it
+    os.makedirs(tmp_path / "perfect" / "relaxed")
+    (tmp_path / "perfect" / "relaxed" / "POSCAR").write_text("")
+    folders = CampaignRunner(str(tmp_path), []).find_folders()
+    assert [os.path.basename(folder) for folder in folders] == ["Va_A", "Va_B"]
+
+
+def test_up_to_date_needs_the_same_inputs_and_the_outputs(tmp_path):
+    script = make_tree(tmp_path)
+    output = tmp_path / "Va_A" / "localized-defects" / "Va_A" / "Data" / "localized_Va_A.dat"
+    runner = CampaignRunner(str(tmp_path), [script], jobs=2)
+    assert statuses(runner) == {"Va_A": "done", "Va_B": "done"}
+    assert statuses(runner) == {"Va_A": "up to date", "Va_B": "up to date"}
+    stamp = json.loads((output.parent / "campaign.json").read_text())["localized.py"]
+    assert stamp["outputs"] == [os.path.join("localized-defects", "Va_A", "Data", "localized_Va_A.dat")]
+
+    # Output deleted, or older than the run that wrote it
+    output.unlink()
+    assert statuses(runner) == {"Va_A": "done", "Va_B": "up to date"}
+    os.utime(output, ns=(stamp["started"] - 10**9, stamp["started"] - 10**9))
+    assert statuses(runner) == {"Va_A": "done", "Va_B": "up to date"}
+
+    # Input or options changed
+    (tmp_path / "Va_B" / "vasprun.xml").write_text("<modeling></modeling>")
+    assert statuses(runner) == {"Va_A": "up to date", "Va_B": "done"}
+    assert statuses(CampaignRunner(str(tmp_path), [script], ["--band"])) == {"Va_A": "done", "Va_B": "done"}
+    assert output.read_text() == "--band"
+    assert statuses(CampaignRunner(str(tmp_path), [script], ["--band"], force=True)) == {"Va_A": "done", "Va_B": "done"}
+
+
+def test_failures_stay_in_their_folder(tmp_path):
+    script = make_tree(tmp_path)
+    (tmp_path / "Va_B" / "vasprun.xml").unlink()
+    (tmp_path / "Va_B" / "POSCAR").write_text("")
+    with open(script, 'a') as f:
+        f.write("if name == 'Va_A': raise SystemExit('broken')\n")
+    assert statuses(CampaignRunner(str(tmp_path), [script])) == {"Va_A": "failed", "Va_B": "missing inputs"}
+    log = tmp_path / "Va_A" / "localized-defects" / "Va_A" / "Data" / "campaign.log"
+    assert "broken" in log.read_text()
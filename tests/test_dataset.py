@@ -0,0 +1,76 @@
+# Localized-States contributors
+# 2026-10
+
+import os
+import numpy as np
+from LSPD.reader.dataset import VasprunData
+from LSPD.reader.reader import VasprunReader
+
+
+def test_arrays_match_the_file(vasprun):
+    path, energies, occupancies, projections = vasprun
+    data = VasprunData(str(path))
+    assert data.spin_numbers == [1, 2] and data.kpoint_numbers == [1, 2]
+    assert data.band_numbers == list(range(1, 13))
+    assert data.atoms == ["B", "B", "B", "N", "N", "N"]
+    np.testing.assert_array_equal(data.energies, energies)
+    np.testing.assert_array_equal(data.occupancies, occupancies)
+    # float64: exactly the decimals of vasprun.xml
+    np.testing.assert_array_equal(data.read_projections(1, 0, 3), projections[1, 0, 3])
+    assert data.dielectric["epsilon"][0].split() == ["4.50000000", "0.00000000", "0.00000000"]
+
+
+def test_tree_reader_gives_the_same_arrays(vasprun):
+    path = vasprun[0]
+    streamed, tree = VasprunData(str(path)), VasprunData(VasprunReader(str(path)))
+    np.testing.assert_array_equal(streamed.eigenvalues, tree.eigenvalues)
+    np.testing.assert_array_equal(streamed.projections, tree.projections)
+
+
+def test_cache_gives_the_parsed_arrays(vasprun):
+    path = vasprun[0]
+    parsed = VasprunData(str(path))
+    VasprunData(str(path), cache=True)
+    assert os.path.exists(str(path) + ".lspd/meta.json")
+    cached = VasprunData(str(path), cache=True)
+    np.testing.assert_array_equal(cached.eigenvalues, parsed.eigenvalues)
+    np.testing.assert_array_equal(cached.projections, parsed.projections)
+    np.testing.assert_array_equal(cached.kpoint_coordinates, parsed.kpoint_coordinates)
+    assert cached.dielectric == parsed.dielectric
+    assert cached.atoms == parsed.atoms and cached.orbitals == parsed.orbitals
+
+
+def test_cache_is_rebuilt_when_the_file_changes(vasprun, tmp_path):
+    from conftest import write_vasprun
+    path = vasprun[0]
+    VasprunData(str(path), cache=True)
+    energies = write_vasprun(path, seed=1)[0]
+    np.testing.assert_array_equal(VasprunData(str(path), cache=True).energies, energies)
+
+
+def test_window_index_matches_a_mask(vasprun):
+    data = VasprunData(str(vasprun[0]))
+    for spin in (1, 2):
+        for kpoint in (1, 2):
+            energies = data.energies[spin - 1, kpoint - 1]
+            expected = np.flatnonzero((energies >= 0.0) & (energies <= 8.0))
+            np.testing.assert_array_equal(data.bands_in_window(spin, kpoint, 0.0, 8.0), expected)
+    assert data.bands_in_window(3, 1, 0.0, 8.0).size == 0
+
+
+def test_incomplete_cache_is_rebuilt(vasprun):
+    path, energies, _, projections = vasprun
+    folder = str(path) + ".lspd"
+    for broken in ("eigenvalues.npy", "projections.raw"):
+        VasprunData(str(path), cache=True)
+        if broken.endswith(".npy"):
+            os.remove(os.path.join(folder, broken))
+        else:
+            with open(os.path.join(folder, broken), 'r+b') as f:
+                f.truncate(100)
+        data = VasprunData(str(path), cache=True)
+        np.testing.assert_array_equal(data.energies, energies)
+        np.testing.assert_array_equal(data.projections, projections)
+        # Written again: the next run loads it
+        assert os.path.getsize(os.path.join(folder, "projections.raw")) == projections.size * 8
+        np.testing.assert_array_equal(VasprunData(str(path), cache=True).energies, energies)
@@ -0,0 +1,51 @@
+# Localized-States contributors
+# 2026-10
+
+import os
+import shutil
+import numpy as np
+from ase.io import read, write
+from LSPD.analyzer.get_defects import DefectAnalysis
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+
+
+def brute_force_matches(analysis):
+    "Perfect site of every defect atom from all the minimum-image distances, -1 if none within the tolerance."
+    distances = analysis.cartesian_distance(analysis.frac_positions_defect[:, np.newaxis], analysis.frac_positions_perfect)
+    nearest = distances.argmin(axis=1)
+    return np.where(distances.min(axis=1) < analysis.tolerance, nearest, -1)
+
+
+def test_neighbor_atoms_match_the_reference(tmp_path, monkeypatch):
+    # Same layout as the reference: Va_N1_2/POSCAR next to perfect/POSCAR
+    os.makedirs(tmp_path / "Va_N1_2")
+    shutil.copy(os.path.join(TESTS, "defect", "POSCAR"), tmp_path / "Va_N1_2" / "POSCAR")
+    shutil.copytree(os.path.join(TESTS, "perfect"), tmp_path / "perfect")
+    monkeypatch.chdir(tmp_path / "Va_N1_2")
+
+    DefectAnalysis("POSCAR", "../perfect/POSCAR").save_defect_data()
+    with open("localized-defects/Va_N1_2/Data/neighbor_atoms.dat") as f, open(os.path.join(TESTS, "neighbor_atoms.dat")) as reference:
+        assert f.read() == reference.read()
+
+
+def test_every_kind_of_defect_is_found(tmp_path):
+    perfect = read(os.path.join(TESTS, "perfect", "POSCAR"))
+    defect = perfect.copy()
+    symbols = defect.get_chemical_symbols()
+    other = next(symbol for symbol in set(symbols) if symbol != symbols[20])
+    defect[20].symbol = other
+    # An atom wrapped to the other side of the cell is still on its site
+    positions = defect.get_scaled_positions()
+    positions[5] = np.where(positions[5] == 0.0, 1.0 - 1e-6, positions[5])
+    defect.set_scaled_positions(positions)
+    del defect[10]
+    defect.append(other)
+    defect.positions[-1] = defect.cell.cartesian_positions([0.01, 0.02, 0.03])
+    write(tmp_path / "POSCAR", defect, format="vasp")
+
+    analysis = DefectAnalysis(str(tmp_path / "POSCAR"), os.path.join(TESTS, "perfect", "POSCAR"))
+    np.testing.assert_array_equal(analysis.match_sites(), brute_force_matches(analysis))
+    assert [index for _, _, index in analysis.find_vacancy()] == [11]
+    assert [(new, old, index) for new, old, _, _, index in analysis.find_susbstitutional()] == [(other, symbols[20], 21)]
+    assert [index for _, _, index in analysis.find_interstitial()] == [len(defect)]
@@ -0,0 +1,52 @@
+# Localized-States contributors
+# 2026-10
+
+import numpy as np
+from LSPD.analyzer.energy_window import EnergyWindowIndex, band_groups, degenerate_groups, table_precision
+
+
+def pairwise_groups(energies, bands, tolerance, kpoints=None):
+    "Groups of the plotters before band_groups: every pair of states tested."
+    kpoints = [0] * len(energies) if kpoints is None else kpoints
+    return [tuple(sorted({b2 for b2, e2, k2 in zip(bands, energies, kpoints) if k2 == k1 and abs(e1 - e2) <= tolerance}))
+            for e1, k1 in zip(energies, kpoints)]
+
+
+def test_window_index_matches_a_mask():
+    rng = np.random.default_rng(0)
+    energies = rng.uniform(-5, 5, size=(2, 3, 40))
+    index = EnergyWindowIndex(energies)
+    for emin, emax in ((-1.0, 1.0), (energies[1, 2, 7], energies[1, 2, 7]), (6.0, 7.0)):
+        for spin in range(2):
+            for kpoint in range(3):
+                block = energies[spin, kpoint]
+                expected = np.flatnonzero((block >= emin) & (block <= emax))
+                np.testing.assert_array_equal(index.bands_in_window(emin, emax, spin, kpoint), expected)
+
+
+def test_table_precision_matches_the_printed_table():
+    energies = np.random.default_rng(0).uniform(-5, 15, 1000)
+    rounded = table_precision(energies)
+    assert rounded.dtype == float
+    np.testing.assert_array_equal(rounded, [float(f"{energy:.3f}") for energy in energies])
+    np.testing.assert_array_equal(table_precision([1.23456], 2), [1.23])
+
+
+def test_band_groups_match_the_pairwise_groups():
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        size = int(rng.integers(1, 30))
+        # 3 decimals as in the results table, many pairs exactly 0.1 eV apart
+        energies = np.round(rng.uniform(0, 2, size), 1) + rng.choice([0.0, 0.001], size)
+        kpoints = rng.integers(1, 3, size).tolist()
+        bands = list(range(1, size + 1))
+        assert band_groups(energies, bands, 0.1, kpoints) == pairwise_groups(list(energies), bands, 0.1, kpoints)
+        assert band_groups(energies, bands, 0.1) == pairwise_groups(list(energies), bands, 0.1)
+
+
+def test_degenerate_groups_cover_every_state_once():
+    energies = [1.000, 1.004, 1.009, 2.0, 1.000, 1.003]
+    kpoints = [1, 1, 1, 1, 2, 2]
+    groups = degenerate_groups(energies, [1, 2, 3, 4, 1, 2], [1, 1, 0, 0, 1, 0], kpoints)
+    assert [(group["kpoint"], group["bands"]) for group in groups] == [(1, [1, 2]), (1, [3]), (1, [4]), (2, [1, 2])]
+    assert sorted(i for group in groups for i in group["positions"]) == list(range(6))
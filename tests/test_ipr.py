@@ -0,0 +1,130 @@
+# Localized-States contributors
+# 2026-10
+
+import os
+import shutil
+import subprocess
+import sys
+import numpy as np
+import pytest
+from LSPD.reader.wavecar import WavecarReader
+from LSPD.analyzer.get_ipr import IPRAnalyzer, IPRCache, parallel_ipr
+from conftest import REPOSITORY, write_vasprun, write_wavecar
+
+
+def reference_ipr(wfc, spin, kpoint, band):
+    "IPR of one band from the whole-grid inverse FFT of its coefficients (vaspwfc.wfc_r), as before the batches."
+    ngrid = 2 * np.asarray(wfc._ngrid)
+    gvectors = wfc.gvectors(kpoint)
+    coefficients = wfc.readBandCoeff(spin, kpoint, band)
+    grid = np.zeros(ngrid, dtype=np.complex128)
+    if wfc._lgam:
+        coefficients = coefficients.copy()
+        coefficients[1:] /= np.sqrt(2.0)
+        grid[tuple(gvectors.T)] = coefficients
+        grid[tuple((-gvectors).T)] = coefficients.conj()
+        psi = np.fft.ifftn(grid).real
+    else:
+        grid[tuple(gvectors.T)] = coefficients
+        psi = np.fft.ifftn(grid)
+    density = np.abs(psi) ** 2
+    return np.sum(density ** 2) / np.sum(density) ** 2
+
+
+def test_wavecar_reader_matches_the_records(tmp_path):
+    wfc = write_wavecar(tmp_path / "WAVECAR")
+    wavecar = WavecarReader(str(tmp_path / "WAVECAR"))
+    assert (wavecar.nspin, wavecar.nkpoints, wavecar.nbands) == (2, 2, 6)
+    np.testing.assert_array_equal(wavecar.cell, wfc._Acell)
+    np.testing.assert_array_equal(wavecar.energies, wfc._bands)
+    np.testing.assert_array_equal(wavecar.coefficients(2, 1, [1, 2, 3]), wfc.coefficients[1][0][:3])
+    np.testing.assert_array_equal(wavecar.coefficients(1, 2, [5, 2]), wfc.coefficients[0][1][[4, 1]])
+
+
+def test_truncated_wavecar_is_rejected(tmp_path):
+    write_wavecar(tmp_path / "WAVECAR")
+    data = (tmp_path / "WAVECAR").read_bytes()
+    (tmp_path / "WAVECAR").write_bytes(data[:len(data) // 2])
+    with pytest.raises(ValueError):
+        WavecarReader(str(tmp_path / "WAVECAR"))
+
+
+@pytest.mark.parametrize("gamma", [False, True])
+def test_batched_ipr_matches_the_band_by_band_ipr(tmp_path, gamma):
+    wfc = write_wavecar(tmp_path / "WAVECAR", nkpoints=1 if gamma else 2, gamma=gamma)
+    # One band per batch read through wfc, then every band in one batch from the mapped file
+    for memory, wavecar in ((2**20, None), (64 * 2**20, WavecarReader(str(tmp_path / "WAVECAR")))):
+        analyzer = IPRAnalyzer(wfc, memory=memory, wavecar=wavecar)
+        for spin in (1, 2):
+            for kpoint in range(1, wfc._nkpts + 1):
+                expected = [reference_ipr(wfc, spin, kpoint, band) for band in range(1, 7)]
+                np.testing.assert_allclose(analyzer.ipr(spin, kpoint, range(1, 7)), expected, rtol=1e-10)
+
+
+def test_metrics_give_the_same_ipr(tmp_path):
+    wfc = write_wavecar(tmp_path / "WAVECAR")
+    analyzer = IPRAnalyzer(wfc, center=(0.5, 0.5, 0.5), radii=(1.0, 50.0))
+    metrics = analyzer.metrics(1, 2, [1, 4, 6])
+    assert list(metrics) == ["ipr", "spread", "sphere_1", "sphere_50"]
+    np.testing.assert_allclose(metrics["ipr"], analyzer.ipr(1, 2, [1, 4, 6]), rtol=1e-12)
+    # The largest sphere holds the whole cell
+    np.testing.assert_allclose(metrics["sphere_50"], 1.0)
+    assert np.all((metrics["sphere_1"] >= 0) & (metrics["sphere_1"] <= 1))
+    assert np.all(metrics["spread"] > 0)
+
+
+def test_coarse_grid_stays_close_to_the_full_grid(tmp_path):
+    wfc = write_wavecar(tmp_path / "WAVECAR")
+    _, _, deviation = IPRAnalyzer(wfc, scale=0.75).deviation([(1, 1, 1), (2, 2, 6)])
+    assert np.all(deviation < 0.5)
+
+
+def test_parallel_ipr_matches_one_process(tmp_path):
+    wfc = write_wavecar(tmp_path / "WAVECAR")
+    tasks = [(1, 1, [1, 2, 3]), (2, 2, [4, 5, 6])]
+    analyzer = IPRAnalyzer(wfc)
+    # The WavecarFile is its own picklable factory, as functools.partial(vaspwfc, ...)
+    values = parallel_ipr(wfc, tasks, 2, wav_file=str(tmp_path / "WAVECAR"))
+    for task, block in zip(tasks, values):
+        np.testing.assert_allclose(block, analyzer.ipr(*task), rtol=1e-12)
+
+
+def test_ipr_cache_keeps_the_computed_bands(tmp_path):
+    write_wavecar(tmp_path / "WAVECAR")
+    cache = IPRCache(str(tmp_path / "WAVECAR"), (2, 2, 6), (20, 20, 20))
+    assert cache.missing(1, 1, [1, 2, 3]) == [1, 2, 3]
+    cache.update(1, 1, [2, 3], {"ipr": np.array([0.1, 0.2])})
+    cache.save()
+
+    cache = IPRCache(str(tmp_path / "WAVECAR"), (2, 2, 6), (20, 20, 20))
+    assert cache.missing(1, 1, [1, 2, 3]) == [1]
+    np.testing.assert_array_equal(cache.get(1, 1, [2, 3])["ipr"], [0.1, 0.2])
+    # Another grid, or the WAVECAR written again, starts empty
+    assert IPRCache(str(tmp_path / "WAVECAR"), (2, 2, 6), (10, 10, 10)).missing(1, 1, [2]) == [2]
+    write_wavecar(tmp_path / "WAVECAR", seed=1)
+    assert IPRCache(str(tmp_path / "WAVECAR"), (2, 2, 6), (20, 20, 20)).missing(1, 1, [2]) == [2]
+
+
+def test_radii_metrics_are_saved(tmp_path):
+    pytest.importorskip("vaspwfc")
+    folder = tmp_path / "Va_N1_2"
+    os.makedirs(folder)
+    energies = write_vasprun(folder / "vasprun.xml")[0]
+    write_wavecar(folder / "WAVECAR", nbands=12)
+    shutil.copy(os.path.join(REPOSITORY, "tests", "defect", "POSCAR"), folder / "POSCAR")
+    shutil.copytree(os.path.join(REPOSITORY, "tests", "perfect"), tmp_path / "perfect")
+    env = dict(os.environ, MPLBACKEND="Agg", PYTHONPATH=os.pathsep.join([REPOSITORY, os.environ.get("PYTHONPATH", "")]))
+    subprocess.run([sys.executable, os.path.join(REPOSITORY, "ipr.py"), "--radii", "1", "2"], cwd=folder, env=env,
+                   check=True, capture_output=True)
+
+    with open(folder / "localized-defects" / "Va_N1_2" / "Data" / "ipr_metrics.dat") as f:
+        lines = f.read().splitlines()
+    assert lines[0] == "Defect: Va_N1_2"
+    assert lines[4].startswith("Defect site = ") and lines[4].endswith("radii = 1 2 A")
+    assert lines[7].split() == ["Spin", "k-point", "Band", "IPR", "Energy", "Occ", "Spread", "sphere_1", "sphere_2"]
+    rows = np.array([line.split() for line in lines[8:] if line], dtype=float)
+    assert rows.shape == (2 * 2 * 12, 9)
+    np.testing.assert_array_equal(rows[:, :3], [(s, k, b) for s in (1, 2) for k in (1, 2) for b in range(1, 13)])
+    np.testing.assert_allclose(rows[:, 4], energies.ravel(), atol=5e-4)
+    assert np.all(rows[:, 3] > 0) and np.all(rows[:, 6] > 0)
+    assert np.all((0 <= rows[:, 7]) & (rows[:, 7] <= rows[:, 8]) & (rows[:, 8] <= 1))